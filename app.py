@@ -8,7 +8,10 @@ load_dotenv()
 from src.auth import render_login_page, handle_logout
 from src.product_manager import render_product_management_section
 from src.stock_manager import render_stock_summary_section, render_detailed_movements_section
-from src.shipment_manager import render_shipment_management_section # Apenas confirmar que está aqui
+from src.shipment_manager import render_shipment_management_section, render_recent_shipments_summary
+from src.precompute import get_dashboard_precomputer, render_precompute_controls
+from src.forecasting import render_reorder_forecast_section
+from src.display import render_session_memory_usage
 
 st.set_page_config(
     page_title="Sistema de Estoque",
@@ -18,6 +21,8 @@ st.set_page_config(
 
 st.title("Sistema de Gerenciamento de Estoque")
 
+get_dashboard_precomputer() # Inicia o pré-cálculo do painel em segundo plano (uma vez por processo)
+
 if 'user' not in st.session_state:
     render_login_page()
 else:
@@ -26,15 +31,19 @@ else:
 
     st.subheader("Painel de Controle")
 
-    tab1, tab2, tab3, tab4 = st.tabs([
+    tab1, tab2, tab3, tab4, tab5 = st.tabs([
         "Resumo de Estoque",
         "Movimentos Detalhados",
         "Remessas",
-        "Gerenciar Produtos"
+        "Gerenciar Produtos",
+        "Previsão de Reposição"
     ])
 
     with tab1:
+        render_precompute_controls()
         render_stock_summary_section()
+        st.markdown("---")
+        render_recent_shipments_summary()
 
     with tab2:
         render_detailed_movements_section()
@@ -44,3 +53,8 @@ else:
 
     with tab4:
         render_product_management_section()
+
+    with tab5:
+        render_reorder_forecast_section()
+
+    render_session_memory_usage() # Ao final do rerun, depois que as abas atualizaram o session_state
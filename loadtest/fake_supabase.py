@@ -0,0 +1,346 @@
+# loadtest/fake_supabase.py
+"""
+Cliente Supabase falso, em memória, para testes de carga. Implementa apenas o subconjunto da API
+do PostgREST usado pela aplicação (select com recursos embutidos, filtros, ordenação, paginação
+e insert), mantém as agregações de movimentos como o trigger da migration 001 e simula a visão
+`remessas_resumo` da migration 003. Cada `execute()` dorme a latência configurada.
+"""
+import random
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from types import SimpleNamespace
+
+# Relacionamentos usados nos selects embutidos: (tabela, recurso) -> (tabela alvo, coluna local, coluna alvo, muitos?)
+RELATIONSHIPS = {
+    ('movimentos_estoque', 'produtos'): ('produtos', 'produto_id', 'id', False),
+    ('itens_remessa', 'produtos'): ('produtos', 'produto_id', 'id', False),
+    ('itens_remessa', 'remessas'): ('remessas', 'remessa_id', 'id', False),
+    ('remessas', 'itens_remessa'): ('itens_remessa', 'id', 'remessa_id', True),
+}
+
+def _utc_now() -> str:
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def _split_top_level(text: str) -> list:
+    """Separa uma lista de colunas por vírgulas que não estejam dentro de parênteses."""
+    parts, depth, current = [], 0, []
+    for char in text:
+        if char == ',' and depth == 0:
+            parts.append(''.join(current).strip())
+            current = []
+            continue
+        depth += char == '('
+        depth -= char == ')'
+        current.append(char)
+    if ''.join(current).strip():
+        parts.append(''.join(current).strip())
+    return [part for part in parts if part]
+
+def _parse_select(text: str) -> list:
+    """Converte o select do PostgREST em [(coluna, None, False)] ou [(recurso, sub_select, inner)]."""
+    fields = []
+    for part in _split_top_level(' '.join(text.split())):
+        if '(' in part:
+            name, inner_text = part.split('(', 1)
+            name = name.strip()
+            inner = name.endswith('!inner')
+            fields.append((name.replace('!inner', ''), _parse_select(inner_text[:-1]), inner))
+        else:
+            fields.append((part, None, False))
+    return fields
+
+
+class FakeResponse(SimpleNamespace):
+    pass
+
+
+class FakeQuery:
+    def __init__(self, db, table: str, params: dict = None):
+        self._db = db
+        self._table = table
+        self._params = params
+        self._select = [('*', None, False)]
+        self._count = None
+        self._filters = []
+        self._orders = []
+        self._range = None
+        self._insert = None
+
+    def select(self, columns: str = '*', count: str = None):
+        self._select = _parse_select(columns)
+        self._count = count
+        return self
+
+    def insert(self, data):
+        self._insert = data if isinstance(data, list) else [data]
+        return self
+
+    def _filter(self, column, predicate):
+        self._filters.append((column, predicate))
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, lambda v: v == value)
+
+    def gte(self, column, value):
+        return self._filter(column, lambda v: v is not None and str(v) >= str(value))
+
+    def lt(self, column, value):
+        return self._filter(column, lambda v: v is not None and str(v) < str(value))
+
+    def in_(self, column, values):
+        values = set(values)
+        return self._filter(column, lambda v: v in values)
+
+    def lte(self, column, value):
+        return self._filter(column, lambda v: v is not None and str(v) <= str(value))
+
+    def like(self, column, pattern):
+        prefix = pattern.rstrip('%*')
+        return self._filter(column, lambda v: v is not None and str(v).startswith(prefix))
+
+    def order(self, column, desc: bool = False):
+        self._orders.append((column, desc))
+        return self
+
+    def range(self, start: int, end: int):
+        self._range = (start, end)
+        return self
+
+    def execute(self):
+        self._db.sleep_latency()
+        if self._insert is not None:
+            return FakeResponse(data=self._db.insert(self._table, self._insert), count=None)
+        if self._params is not None:
+            return FakeResponse(data=self._db.call_function(self._table, self._params), count=None)
+        return self._db.select(self)
+
+
+class FakeAuth:
+    def sign_in_with_password(self, credentials):
+        return SimpleNamespace(user=SimpleNamespace(id=str(uuid.uuid4()), email=credentials['email']))
+
+    def sign_out(self):
+        return None
+
+
+class FakeSupabaseClient:
+    """Substituto de `supabase.Client` com tabelas em memória e latência injetada por chamada."""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.auth = FakeAuth()
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+        self._tables = {name: [] for name in (
+            'produtos', 'movimentos_estoque', 'remessas', 'itens_remessa',
+            'movimentos_resumo_diario', 'movimentos_resumo_mensal'
+        )}
+        self._rollup_index = {}
+
+    def from_(self, table: str) -> FakeQuery:
+        return FakeQuery(self, table)
+
+    def rpc(self, func: str, params: dict) -> FakeQuery:
+        return FakeQuery(self, func, params)
+
+    def sleep_latency(self):
+        with self._lock:
+            self.calls += 1
+            delay = self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+
+    # --- Escrita ---
+
+    def insert(self, table: str, rows: list) -> list:
+        inserted = []
+        with self._lock:
+            for row in rows:
+                row = dict(row)
+                row.setdefault('id', str(uuid.uuid4()))
+                if table == 'produtos':
+                    if any(p['nome_produto'] == row['nome_produto'] for p in self._tables['produtos']):
+                        raise Exception("duplicate key value violates unique constraint \"produtos_nome_produto_key\"")
+                    row.setdefault('sku', None)
+                    row.setdefault('created_at', _utc_now())
+                elif table == 'movimentos_estoque':
+                    row.setdefault('data_movimento', _utc_now())
+                    row.setdefault('observacao', None)
+                    row.setdefault('referencia_transacao_id', None)
+                    self._apply_rollup(row)
+                elif table == 'remessas':
+                    row.setdefault('data_remessa', _utc_now())
+                    row.setdefault('observacao_remessa', None)
+                self._tables[table].append(row)
+                inserted.append(dict(row))
+        return inserted
+
+    def _apply_rollup(self, movement: dict):
+        """Equivalente ao trigger `movimentos_estoque_resumo` (dias em UTC)."""
+        day = movement['data_movimento'][:10]
+        for table, bucket in (('movimentos_resumo_diario', 'dia'), ('movimentos_resumo_mensal', 'mes')):
+            bucket_value = day if bucket == 'dia' else day[:8] + '01'
+            key = (table, movement['produto_id'], bucket_value, movement['tipo_movimento'])
+            rollup = self._rollup_index.get(key)
+            if rollup is None:
+                rollup = {
+                    'produto_id': movement['produto_id'], bucket: bucket_value,
+                    'tipo_movimento': movement['tipo_movimento'], 'quantidade_total': 0.0, 'total_movimentos': 0
+                }
+                self._rollup_index[key] = rollup
+                self._tables[table].append(rollup)
+            rollup['quantidade_total'] += float(movement['quantidade_movimentada'])
+            rollup['total_movimentos'] += 1
+
+    # --- Leitura ---
+
+    def call_function(self, func: str, params: dict):
+        """Equivalente às funções SQL chamadas por RPC (ver migrations/004 e 005)."""
+        if func == 'saidas_diarias_por_produto':
+            return self._daily_exits_by_product(params)
+        if func == 'totais_movimentos_mensais':
+            return self._movement_totals('movimentos_resumo_mensal', 'mes', params['p_mes_inicio'], params['p_mes_fim'], upper_inclusive=False)
+        if func == 'totais_movimentos_diarios':
+            return self._movement_totals('movimentos_resumo_diario', 'dia', params['p_dia_inicio'], params['p_dia_fim'], upper_inclusive=True)
+        raise Exception(f"Could not find the function public.{func}")
+
+    def _movement_totals(self, table: str, bucket: str, lower: str, upper: str, upper_inclusive: bool) -> dict:
+        totals = {}
+        with self._lock:
+            for rollup in self._tables[table]:
+                value = rollup[bucket]
+                if lower and value < lower:
+                    continue
+                if upper and (value > upper if upper_inclusive else value >= upper):
+                    continue
+                key = (rollup['produto_id'], rollup['tipo_movimento'])
+                totals[key] = totals.get(key, 0.0) + rollup['quantidade_total']
+        keys = sorted(totals)
+        return {
+            "produto_id": [product_id for product_id, _ in keys],
+            "tipo_movimento": [movement_type for _, movement_type in keys],
+            "quantidade": [totals[key] for key in keys]
+        }
+
+    def _daily_exits_by_product(self, params: dict) -> dict:
+        start = date.fromisoformat(params['p_inicio'])
+        per_product = {}
+        with self._lock:
+            for rollup in self._tables['movimentos_resumo_diario']:
+                if rollup['tipo_movimento'].startswith('saida') and params['p_inicio'] <= rollup['dia'] <= params['p_fim']:
+                    days = per_product.setdefault(rollup['produto_id'], {})
+                    offset = (date.fromisoformat(rollup['dia']) - start).days
+                    days[offset] = days.get(offset, 0.0) + rollup['quantidade_total']
+        product_ids = sorted(per_product)
+        return {
+            "produto_id": product_ids,
+            "dias": [sorted(per_product[product_id]) for product_id in product_ids],
+            "quantidades": [[per_product[product_id][day] for day in sorted(per_product[product_id])] for product_id in product_ids]
+        }
+
+    def _rows(self, table: str) -> list:
+        if table == 'remessas_resumo':
+            totals = {}
+            for item in self._tables['itens_remessa']:
+                total, count = totals.get(item['remessa_id'], (0.0, 0))
+                totals[item['remessa_id']] = (total + float(item['subtotal_item']), count + 1)
+            return [
+                dict(shipment, total_remessa=totals.get(shipment['id'], (0.0, 0))[0], total_itens=totals.get(shipment['id'], (0.0, 0))[1])
+                for shipment in self._tables['remessas']
+            ]
+        return list(self._tables[table])
+
+    def _project(self, table: str, row: dict, fields: list):
+        """Aplica o select a uma linha; retorna None se um recurso `!inner` não tiver correspondência."""
+        result = {}
+        for name, sub_fields, inner in fields:
+            if sub_fields is None:
+                if name == '*':
+                    result.update(row)
+                else:
+                    result[name] = row.get(name)
+                continue
+            target, local_column, target_column, many = RELATIONSHIPS[(table, name)]
+            matches = [r for r in self._tables[target] if r.get(target_column) == row.get(local_column)]
+            projected = [p for p in (self._project(target, m, sub_fields) for m in matches) if p is not None]
+            if many:
+                result[name] = projected
+            else:
+                result[name] = projected[0] if projected else None
+                if inner and result[name] is None:
+                    return None
+        return result
+
+    def _value(self, table: str, row: dict, column: str):
+        if '.' in column:
+            resource, sub_column = column.split('.', 1)
+            target, local_column, target_column, _ = RELATIONSHIPS[(table, resource)]
+            match = next((r for r in self._tables[target] if r.get(target_column) == row.get(local_column)), None)
+            return match.get(sub_column) if match else None
+        return row.get(column)
+
+    def select(self, query: FakeQuery) -> FakeResponse:
+        with self._lock:
+            rows = [r for r in self._rows(query._table)
+                    if all(predicate(self._value(query._table, r, column)) for column, predicate in query._filters)]
+            for column, desc in reversed(query._orders):
+                rows.sort(key=lambda r: (r.get(column) is None, r.get(column)), reverse=desc)
+            count = len(rows)
+            if query._range:
+                start, end = query._range
+                if query._count and start > 0 and start >= count:
+                    # O PostgREST responde 416 a uma página além do fim quando a contagem é pedida
+                    raise Exception({"code": "PGRST103", "message": "Requested range not satisfiable"})
+                rows = rows[start:end + 1]
+            data = [p for p in (self._project(query._table, r, query._select) for r in rows) if p is not None]
+        return FakeResponse(data=data, count=count if query._count else None)
+
+# --- Dados de demonstração ---
+
+def seed_demo_data(client: FakeSupabaseClient, products: int = 50, days: int = 120, movements_per_day: int = 20,
+                   shipments_per_day: int = 3, seed: int = 0):
+    """Popula o cliente falso com produtos, entradas, saídas e remessas distribuídos nos últimos `days` dias."""
+    rng = random.Random(seed)
+    latency = (client.latency_ms, client.jitter_ms)
+    client.latency_ms, client.jitter_ms = 0.0, 0.0 # Sem latência durante a carga inicial
+
+    units = ['kg', 'un', 'litro', 'caixa']
+    product_ids = [
+        client.from_('produtos').insert({"nome_produto": f"Produto {i:04d}", "unidade_medida": rng.choice(units), "sku": f"SKU{i:05d}"}).execute().data[0]['id']
+        for i in range(products)
+    ]
+    destinations = [f"Cliente {i:02d}" for i in range(12)]
+    start = date.today() - timedelta(days=days - 1)
+
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        timestamp = f"{day}T00:00:00Z"
+        for _ in range(movements_per_day):
+            movement_type = rng.choice(['entrada_compra', 'entrada_compra', 'entrada_producao', 'saida_venda', 'saida_perda'])
+            client.from_('movimentos_estoque').insert({
+                "produto_id": rng.choice(product_ids), "tipo_movimento": movement_type,
+                "quantidade_movimentada": round(rng.uniform(1, 50), 2), "data_movimento": timestamp
+            }).execute()
+        for _ in range(shipments_per_day):
+            shipment_id = client.from_('remessas').insert({"destino": rng.choice(destinations), "data_remessa": timestamp}).execute().data[0]['id']
+            for product_id in rng.sample(product_ids, k=min(3, len(product_ids))):
+                quantity = round(rng.uniform(1, 10), 2)
+                price = round(rng.uniform(5, 100), 2)
+                client.from_('itens_remessa').insert({
+                    "remessa_id": shipment_id, "produto_id": product_id, "quantidade_remetida": quantity,
+                    "preco_unitario_na_remessa": price, "subtotal_item": quantity * price
+                }).execute()
+                client.from_('movimentos_estoque').insert({
+                    "produto_id": product_id, "tipo_movimento": "saida_remessa",
+                    "quantidade_movimentada": quantity, "data_movimento": timestamp,
+                    "referencia_transacao_id": shipment_id
+                }).execute()
+
+    client.latency_ms, client.jitter_ms = latency
+    client.calls = 0
+    return product_ids
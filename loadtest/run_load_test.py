@@ -0,0 +1,262 @@
+# loadtest/run_load_test.py
+"""
+Teste de carga da aplicação: executa várias sessões simuladas em paralelo com o `AppTest` do Streamlit,
+contra um Supabase falso em memória com latência injetada, e reporta vazão, latência de rerun (p50/p95)
+e memória por sessão.
+
+Uso (a partir da raiz do repositório):
+    python -m loadtest.run_load_test --sessions 20 --concurrency 10 --latency-ms 40
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from streamlit.runtime import Runtime
+from streamlit.testing.v1 import AppTest
+from loadtest.fake_supabase import FakeSupabaseClient, seed_demo_data
+from src.display import estimate_nbytes
+from src.date_utils import today
+import src.database
+import src.precompute
+
+APP_PATH = os.path.join(REPO_ROOT, "app.py")
+
+
+def _share_test_runtime():
+    """
+    Cada `AppTest.run()` instala um Runtime falso global e o remove ao terminar, o que derruba as outras
+    sessões que ainda estão executando. Para permitir sessões simultâneas no mesmo processo (como em uma
+    réplica real), `Runtime.instance()` passa a reutilizar o último Runtime falso visto quando o global já foi removido.
+    """
+    original_instance = Runtime.instance.__func__
+    last_runtime = {}
+
+    def instance(cls):
+        if cls._instance is not None:
+            last_runtime['runtime'] = cls._instance
+            return cls._instance
+        if 'runtime' in last_runtime:
+            return last_runtime['runtime']
+        return original_instance(cls)
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: cls._instance is not None or 'runtime' in last_runtime)
+
+
+class SessionMetrics:
+    """Acumula as latências de rerun e as falhas de todas as sessões (seguro entre threads)."""
+
+    def __init__(self):
+        self.rerun_latencies = {}
+        self.errors = []
+        self._lock = threading.Lock()
+
+    def record(self, step: str, seconds: float):
+        with self._lock:
+            self.rerun_latencies.setdefault(step, []).append(seconds)
+
+    def record_error(self, session_id: int, step: str, error: str):
+        with self._lock:
+            self.errors.append({"sessao": session_id, "etapa": step, "erro": error})
+
+    def all_latencies(self) -> list:
+        return [latency for latencies in self.rerun_latencies.values() for latency in latencies]
+
+
+def _timed_run(at: AppTest, metrics: SessionMetrics, step: str, timeout: float):
+    started = time.perf_counter()
+    at.run(timeout=timeout)
+    metrics.record(step, time.perf_counter() - started)
+    if at.exception:
+        raise RuntimeError(f"{step}: {at.exception[0].value}")
+
+def _button_by_label(at: AppTest, label: str):
+    return next(button for button in at.button if button.label == label)
+
+def run_session(session_id: int, metrics: SessionMetrics, iterations: int, timeout: float) -> AppTest:
+    """Executa o roteiro de uma sessão: login, filtros de data, navegação pelas abas e uma remessa finalizada."""
+    step = "inicio"
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    try:
+        _timed_run(at, metrics, step, timeout)
+
+        step = "login"
+        at.text_input(key="login_email").input(f"usuario{session_id}@teste.com")
+        at.text_input(key="login_password").input("senha")
+        at.button(key="login_button").click()
+        _timed_run(at, metrics, step, timeout)
+
+        step = "atualizar_dados"
+        at.button(key="precompute_refresh_button").click()
+        _timed_run(at, metrics, step, timeout)
+
+        current_day = today() # Mesmo fuso (APP_TIMEZONE) usado pelo app nos filtros padrão
+        for iteration in range(iterations):
+            # O Streamlit executa todas as abas a cada rerun; trocar de aba equivale a interagir com os widgets dela
+            step = "filtro_resumo"
+            at.date_input(key="start_date_summary").set_value(current_day - timedelta(days=30 + 7 * iteration))
+            _timed_run(at, metrics, step, timeout)
+
+            step = "filtro_movimentos"
+            at.date_input(key="start_date_movements_hist").set_value(current_day - timedelta(days=14 + iteration))
+            _timed_run(at, metrics, step, timeout)
+
+            step = "remessas_pagina"
+            at.date_input(key="start_date_shipments_view").set_value(current_day - timedelta(days=60))
+            _timed_run(at, metrics, step, timeout)
+            page_input = at.number_input(key="shipments_page")
+            if page_input.max > 1:
+                page_input.set_value(2)
+                _timed_run(at, metrics, step, timeout)
+
+            # Encolher o período estando em uma página > 1 deve voltar à primeira página, sem erro de consulta
+            step = "remessas_filtro_reduzido"
+            at.date_input(key="start_date_shipments_view").set_value(current_day)
+            _timed_run(at, metrics, step, timeout)
+            if at.error:
+                raise RuntimeError("; ".join(error.value for error in at.error))
+            at.date_input(key="start_date_shipments_view").set_value(current_day - timedelta(days=60))
+            _timed_run(at, metrics, step, timeout)
+
+            step = "remessas_itens"
+            shipment_select = at.selectbox(key="shipment_items_select")
+            if len(shipment_select.options) > 1:
+                shipment_select.set_value(shipment_select.options[1 + iteration % (len(shipment_select.options) - 1)])
+                _timed_run(at, metrics, step, timeout)
+
+            step = "analise_remessas"
+            at.radio(key="shipment_analytics_granularity").set_value("Mês" if iteration % 2 == 0 else "Semana")
+            _timed_run(at, metrics, step, timeout)
+
+            step = "previsao"
+            at.slider(key="forecast_history_days").set_value(56 + 7 * iteration)
+            _timed_run(at, metrics, step, timeout)
+
+        step = "remessa_adicionar_item"
+        at.number_input(key="rem_item_quantity_input").set_value(1.0)
+        _button_by_label(at, "Adicionar Item à Remessa").click()
+        _timed_run(at, metrics, step, timeout)
+
+        step = "remessa_finalizar"
+        at.text_input(key="final_rem_destination").input(f"Destino Carga {session_id}")
+        _button_by_label(at, "Finalizar Remessa").click()
+        _timed_run(at, metrics, step, timeout)
+        if at.session_state["current_shipment_items"]: # Só é esvaziada quando a remessa é gravada
+            raise RuntimeError("; ".join(error.value for error in at.error) or "remessa não finalizada")
+    except Exception as e:
+        details = [error.value for error in at.error]
+        metrics.record_error(session_id, step, f"{type(e).__name__}: {e}" + (f" (erros na tela: {details})" if details else ""))
+    return at
+
+
+def session_state_nbytes(at: AppTest) -> int:
+    """Memória estimada de tudo o que a sessão guarda no session_state (mesma conta da barra lateral do app)."""
+    return sum(estimate_nbytes(at.session_state[key]) for key in at.session_state.keys())
+
+def check_precompute(metrics: SessionMetrics):
+    """Registra como erro o agendador de pré-cálculo parado ou sem nenhuma execução concluída."""
+    precomputer = src.precompute._precomputer
+    if precomputer is None:
+        metrics.record_error(-1, "pre_calculo", "agendador não foi iniciado")
+    elif precomputer.interval_seconds > 0 and not precomputer.scheduler_alive:
+        metrics.record_error(-1, "pre_calculo", f"thread do agendador parada (último erro: {precomputer.last_error})")
+    elif precomputer.last_run_at is None:
+        metrics.record_error(-1, "pre_calculo", "nenhuma execução concluída")
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Teste de carga multi-sessão do Sistema de Estoque.")
+    parser.add_argument("--sessions", type=int, default=20, help="Total de sessões simuladas.")
+    parser.add_argument("--concurrency", type=int, default=10, help="Sessões executadas simultaneamente.")
+    parser.add_argument("--iterations", type=int, default=2, help="Rodadas de interação por sessão.")
+    parser.add_argument("--latency-ms", type=float, default=40.0, help="Latência média por chamada ao Supabase falso.")
+    parser.add_argument("--jitter-ms", type=float, default=10.0, help="Variação (+/-) da latência injetada.")
+    parser.add_argument("--products", type=int, default=50, help="Produtos nos dados de demonstração.")
+    parser.add_argument("--days", type=int, default=120, help="Dias de histórico nos dados de demonstração.")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Tempo máximo de cada rerun (segundos).")
+    parser.add_argument("--memory-sessions", type=int, default=3,
+                        help="Sessões da fase de memória (tracemalloc), executadas após a fase de carga para não distorcer as latências.")
+    parser.add_argument("--json", dest="json_path", help="Grava o relatório também neste arquivo JSON.")
+    args = parser.parse_args(argv)
+
+    logging.getLogger("streamlit").setLevel(logging.ERROR) # Silencia avisos repetidos a cada rerun
+    _share_test_runtime()
+
+    client = FakeSupabaseClient(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms)
+    seed_demo_data(client, products=args.products, days=args.days)
+    src.database._supabase_client = client # O app obtém o cliente por get_supabase_client()
+
+    # Sessão de aquecimento fora da medição: importações e caches do processo não contam como custo por sessão
+    run_session(-1, SessionMetrics(), 1, args.timeout)
+    client.calls = 0
+
+    # Fase de carga: sessões simultâneas, sem rastreamento de memória
+    metrics = SessionMetrics()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        finished_sessions = list(executor.map(
+            lambda session_id: run_session(session_id, metrics, args.iterations, args.timeout),
+            range(args.sessions)
+        ))
+    elapsed = time.perf_counter() - started
+    supabase_calls = client.calls
+    check_precompute(metrics)
+    session_state_sizes = [len(at.session_state.keys()) for at in finished_sessions]
+    session_state_bytes = [session_state_nbytes(at) for at in finished_sessions]
+    del finished_sessions
+
+    # Fase de memória: com as sessões ainda vivas, a memória retida dividida pelo número de sessões aproxima o custo de cada uma
+    memory_metrics = SessionMetrics()
+    tracemalloc.start()
+    baseline_memory, _ = tracemalloc.get_traced_memory()
+    memory_sessions = [run_session(args.sessions + i, memory_metrics, args.iterations, args.timeout) for i in range(args.memory_sessions)]
+    retained_memory, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    metrics.errors.extend(memory_metrics.errors)
+
+    latencies = metrics.all_latencies()
+    report = {
+        "sessoes": args.sessions,
+        "concorrencia": args.concurrency,
+        "latencia_injetada_ms": args.latency_ms,
+        "duracao_s": round(elapsed, 2),
+        "reruns": len(latencies),
+        "vazao_reruns_por_s": round(len(latencies) / elapsed, 2),
+        "vazao_sessoes_por_s": round(args.sessions / elapsed, 3),
+        "rerun_p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "rerun_p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "rerun_p95_por_etapa_ms": {step: round(percentile(values, 0.95) * 1000, 1) for step, values in metrics.rerun_latencies.items()},
+        "memoria_por_sessao_kb": round((retained_memory - baseline_memory) / max(len(memory_sessions), 1) / 1024, 1),
+        "memoria_pico_mb": round(peak_memory / 1024 / 1024, 1),
+        "chaves_session_state_media": round(statistics.mean(session_state_sizes), 1) if session_state_sizes else 0,
+        "session_state_kb_media": round(statistics.mean(session_state_bytes) / 1024, 1) if session_state_bytes else 0,
+        "session_state_kb_max": round(max(session_state_bytes) / 1024, 1) if session_state_bytes else 0,
+        "chamadas_supabase": supabase_calls,
+        "erros": metrics.errors,
+    }
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 1 if metrics.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
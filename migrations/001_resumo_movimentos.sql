@@ -0,0 +1,96 @@
+-- migrations/001_resumo_movimentos.sql
+-- Tabelas de agregação (rollup) de movimentos de estoque por produto × dia e produto × mês.
+-- São mantidas por trigger em cada INSERT/UPDATE/DELETE de `movimentos_estoque`, de modo que
+-- os KPIs de período somam poucas linhas agregadas em vez de varrer os movimentos brutos.
+-- Os dias são agrupados em UTC, mesma convenção usada na gravação de `data_movimento`.
+
+create table if not exists movimentos_resumo_diario (
+    produto_id uuid not null references produtos(id) on delete cascade,
+    dia date not null,
+    tipo_movimento text not null,
+    quantidade_total numeric not null default 0,
+    total_movimentos integer not null default 0,
+    primary key (produto_id, dia, tipo_movimento)
+);
+
+create index if not exists idx_movimentos_resumo_diario_dia
+    on movimentos_resumo_diario (dia);
+
+create table if not exists movimentos_resumo_mensal (
+    produto_id uuid not null references produtos(id) on delete cascade,
+    mes date not null, -- Primeiro dia do mês
+    tipo_movimento text not null,
+    quantidade_total numeric not null default 0,
+    total_movimentos integer not null default 0,
+    primary key (produto_id, mes, tipo_movimento)
+);
+
+create index if not exists idx_movimentos_resumo_mensal_mes
+    on movimentos_resumo_mensal (mes);
+
+-- Aplica a contribuição de um movimento (sinal +1 para inclusão, -1 para remoção) nas duas tabelas
+create or replace function aplicar_movimento_resumo(
+    p_produto_id uuid,
+    p_data_movimento timestamptz,
+    p_tipo_movimento text,
+    p_quantidade numeric,
+    p_sinal integer
+) returns void
+language plpgsql
+as $$
+declare
+    v_dia date := (p_data_movimento at time zone 'UTC')::date;
+begin
+    insert into movimentos_resumo_diario as r (produto_id, dia, tipo_movimento, quantidade_total, total_movimentos)
+    values (p_produto_id, v_dia, p_tipo_movimento, p_sinal * p_quantidade, p_sinal)
+    on conflict (produto_id, dia, tipo_movimento) do update
+        set quantidade_total = r.quantidade_total + excluded.quantidade_total,
+            total_movimentos = r.total_movimentos + excluded.total_movimentos;
+
+    insert into movimentos_resumo_mensal as r (produto_id, mes, tipo_movimento, quantidade_total, total_movimentos)
+    values (p_produto_id, date_trunc('month', v_dia)::date, p_tipo_movimento, p_sinal * p_quantidade, p_sinal)
+    on conflict (produto_id, mes, tipo_movimento) do update
+        set quantidade_total = r.quantidade_total + excluded.quantidade_total,
+            total_movimentos = r.total_movimentos + excluded.total_movimentos;
+end;
+$$;
+
+create or replace function trg_movimentos_estoque_resumo() returns trigger
+language plpgsql
+as $$
+begin
+    if tg_op in ('UPDATE', 'DELETE') then
+        perform aplicar_movimento_resumo(old.produto_id, old.data_movimento, old.tipo_movimento, old.quantidade_movimentada, -1);
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') then
+        perform aplicar_movimento_resumo(new.produto_id, new.data_movimento, new.tipo_movimento, new.quantidade_movimentada, 1);
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists movimentos_estoque_resumo on movimentos_estoque;
+create trigger movimentos_estoque_resumo
+    after insert or update or delete on movimentos_estoque
+    for each row execute function trg_movimentos_estoque_resumo();
+
+-- Reconstrói as agregações a partir dos movimentos brutos (carga inicial ou correção manual)
+create or replace function reconstruir_resumo_movimentos() returns void
+language sql
+as $$
+    truncate movimentos_resumo_diario, movimentos_resumo_mensal;
+
+    insert into movimentos_resumo_diario (produto_id, dia, tipo_movimento, quantidade_total, total_movimentos)
+    select produto_id, (data_movimento at time zone 'UTC')::date, tipo_movimento,
+           sum(quantidade_movimentada), count(*)
+    from movimentos_estoque
+    group by 1, 2, 3;
+
+    insert into movimentos_resumo_mensal (produto_id, mes, tipo_movimento, quantidade_total, total_movimentos)
+    select produto_id, date_trunc('month', dia)::date, tipo_movimento,
+           sum(quantidade_total), sum(total_movimentos)
+    from movimentos_resumo_diario
+    group by 1, 2, 3;
+$$;
+
+select reconstruir_resumo_movimentos();
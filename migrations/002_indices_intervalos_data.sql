@@ -0,0 +1,69 @@
+-- migrations/002_indices_intervalos_data.sql
+-- Índices para as consultas por intervalo de datas e para o join de itens de remessa.
+-- As consultas enviam limites semiabertos [início, fim) em UTC (ver src/date_utils.py).
+
+create index if not exists idx_movimentos_estoque_produto_data
+    on movimentos_estoque (produto_id, data_movimento);
+
+-- O histórico de movimentos filtra apenas por data, sem produto
+create index if not exists idx_movimentos_estoque_data
+    on movimentos_estoque (data_movimento);
+
+create index if not exists idx_remessas_data
+    on remessas (data_remessa);
+
+create index if not exists idx_itens_remessa_remessa
+    on itens_remessa (remessa_id);
+
+-- Fuso usado para agrupar as agregações por dia. Deve coincidir com APP_TIMEZONE da aplicação;
+-- para alterar: alter database postgres set estoque.timezone = 'America/Sao_Paulo';
+-- e depois executar: select reconstruir_resumo_movimentos();
+create or replace function fuso_estoque() returns text
+language sql stable
+as $$
+    select coalesce(nullif(current_setting('estoque.timezone', true), ''), 'UTC');
+$$;
+
+create or replace function aplicar_movimento_resumo(
+    p_produto_id uuid,
+    p_data_movimento timestamptz,
+    p_tipo_movimento text,
+    p_quantidade numeric,
+    p_sinal integer
+) returns void
+language plpgsql
+as $$
+declare
+    v_dia date := (p_data_movimento at time zone fuso_estoque())::date;
+begin
+    insert into movimentos_resumo_diario as r (produto_id, dia, tipo_movimento, quantidade_total, total_movimentos)
+    values (p_produto_id, v_dia, p_tipo_movimento, p_sinal * p_quantidade, p_sinal)
+    on conflict (produto_id, dia, tipo_movimento) do update
+        set quantidade_total = r.quantidade_total + excluded.quantidade_total,
+            total_movimentos = r.total_movimentos + excluded.total_movimentos;
+
+    insert into movimentos_resumo_mensal as r (produto_id, mes, tipo_movimento, quantidade_total, total_movimentos)
+    values (p_produto_id, date_trunc('month', v_dia)::date, p_tipo_movimento, p_sinal * p_quantidade, p_sinal)
+    on conflict (produto_id, mes, tipo_movimento) do update
+        set quantidade_total = r.quantidade_total + excluded.quantidade_total,
+            total_movimentos = r.total_movimentos + excluded.total_movimentos;
+end;
+$$;
+
+create or replace function reconstruir_resumo_movimentos() returns void
+language sql
+as $$
+    truncate movimentos_resumo_diario, movimentos_resumo_mensal;
+
+    insert into movimentos_resumo_diario (produto_id, dia, tipo_movimento, quantidade_total, total_movimentos)
+    select produto_id, (data_movimento at time zone fuso_estoque())::date, tipo_movimento,
+           sum(quantidade_movimentada), count(*)
+    from movimentos_estoque
+    group by 1, 2, 3;
+
+    insert into movimentos_resumo_mensal (produto_id, mes, tipo_movimento, quantidade_total, total_movimentos)
+    select produto_id, date_trunc('month', dia)::date, tipo_movimento,
+           sum(quantidade_total), sum(total_movimentos)
+    from movimentos_resumo_diario
+    group by 1, 2, 3;
+$$;
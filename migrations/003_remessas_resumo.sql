@@ -0,0 +1,19 @@
+-- migrations/003_remessas_resumo.sql
+-- Visão de cabeçalhos de remessa com totais calculados no banco, para listar remessas
+-- paginadas sem trazer os itens. Os itens são buscados só para a remessa expandida.
+-- Agrupar também por data_remessa permite que o filtro de data seja aplicado antes da agregação
+-- (usando idx_remessas_data e idx_itens_remessa_remessa da migration 002).
+
+create or replace view remessas_resumo
+with (security_invoker = true)
+as
+select
+    r.id,
+    r.data_remessa,
+    r.destino,
+    r.observacao_remessa,
+    coalesce(sum(i.subtotal_item), 0) as total_remessa,
+    count(i.id) as total_itens
+from remessas r
+left join itens_remessa i on i.remessa_id = r.id
+group by r.id, r.data_remessa, r.destino, r.observacao_remessa;
@@ -0,0 +1,32 @@
+-- migrations/004_saidas_diarias_por_produto.sql
+-- Saídas diárias (tipos `saida_*`) agregadas no banco para a previsão de consumo.
+-- Retorna um único objeto JSON em colunas, com uma entrada por produto:
+--   {"produto_id": [...], "dias": [[...], ...], "quantidades": [[...], ...]}
+-- onde `dias` é o deslocamento em dias a partir de p_inicio. Por ser uma única linha, a resposta
+-- não é cortada pelo limite de linhas do PostgREST e dispensa paginação (que executaria a agregação
+-- uma vez por página): 10 mil produtos × 90 dias chegam em uma chamada em vez de 900 páginas.
+-- Usa a chave primária de movimentos_resumo_diario e idx_movimentos_resumo_diario_dia (migration 001).
+
+create or replace function saidas_diarias_por_produto(p_inicio date, p_fim date)
+returns jsonb
+language sql stable
+as $$
+    select jsonb_build_object(
+        'produto_id', coalesce(jsonb_agg(p.produto_id order by p.produto_id), '[]'::jsonb),
+        'dias', coalesce(jsonb_agg(p.dias order by p.produto_id), '[]'::jsonb),
+        'quantidades', coalesce(jsonb_agg(p.quantidades order by p.produto_id), '[]'::jsonb)
+    )
+    from (
+        select d.produto_id,
+               jsonb_agg(d.dia - p_inicio order by d.dia) as dias,
+               jsonb_agg(d.quantidade order by d.dia) as quantidades
+        from (
+            select produto_id, dia, sum(quantidade_total) as quantidade
+            from movimentos_resumo_diario
+            where tipo_movimento like 'saida%'
+              and dia between p_inicio and p_fim
+            group by produto_id, dia
+        ) d
+        group by d.produto_id
+    ) p;
+$$;
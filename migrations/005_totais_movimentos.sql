@@ -0,0 +1,46 @@
+-- migrations/005_totais_movimentos.sql
+-- Totais de movimentos por produto × tipo somados no banco a partir das agregações da migration 001,
+-- para o cálculo de saldos (src/stock_manager.py: fetch_movement_totals). O resultado tem uma entrada
+-- por produto × tipo, em vez de uma linha por produto × tipo × mês: com 10 mil produtos e anos de
+-- histórico a leitura paginada das tabelas de agregação levaria centenas de chamadas.
+-- Retornam um único objeto JSON em colunas (sem o limite de linhas do PostgREST):
+--   {"produto_id": [...], "tipo_movimento": [...], "quantidade": [...]}
+-- Limites nulos significam intervalo aberto.
+
+-- Meses em [p_mes_inicio, p_mes_fim) (primeiro dia de cada mês)
+create or replace function totais_movimentos_mensais(p_mes_inicio date, p_mes_fim date)
+returns jsonb
+language sql stable
+as $$
+    select jsonb_build_object(
+        'produto_id', coalesce(jsonb_agg(t.produto_id order by t.produto_id, t.tipo_movimento), '[]'::jsonb),
+        'tipo_movimento', coalesce(jsonb_agg(t.tipo_movimento order by t.produto_id, t.tipo_movimento), '[]'::jsonb),
+        'quantidade', coalesce(jsonb_agg(t.quantidade order by t.produto_id, t.tipo_movimento), '[]'::jsonb)
+    )
+    from (
+        select produto_id, tipo_movimento, sum(quantidade_total) as quantidade
+        from movimentos_resumo_mensal
+        where (p_mes_inicio is null or mes >= p_mes_inicio)
+          and (p_mes_fim is null or mes < p_mes_fim)
+        group by produto_id, tipo_movimento
+    ) t;
+$$;
+
+-- Dias em [p_dia_inicio, p_dia_fim] (inclusivo)
+create or replace function totais_movimentos_diarios(p_dia_inicio date, p_dia_fim date)
+returns jsonb
+language sql stable
+as $$
+    select jsonb_build_object(
+        'produto_id', coalesce(jsonb_agg(t.produto_id order by t.produto_id, t.tipo_movimento), '[]'::jsonb),
+        'tipo_movimento', coalesce(jsonb_agg(t.tipo_movimento order by t.produto_id, t.tipo_movimento), '[]'::jsonb),
+        'quantidade', coalesce(jsonb_agg(t.quantidade order by t.produto_id, t.tipo_movimento), '[]'::jsonb)
+    )
+    from (
+        select produto_id, tipo_movimento, sum(quantidade_total) as quantidade
+        from movimentos_resumo_diario
+        where (p_dia_inicio is null or dia >= p_dia_inicio)
+          and (p_dia_fim is null or dia <= p_dia_fim)
+        group by produto_id, tipo_movimento
+    ) t;
+$$;
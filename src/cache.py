@@ -0,0 +1,428 @@
+# src/cache.py
+import os
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+import functools
+import inspect
+import contextlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, NamedTuple
+from src.resilience import (
+    QUERY_DEADLINE_SECONDS, CircuitOpenError, DeadlineExceededError,
+    get_database_circuit_breaker, submit_query, in_query_worker
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "300"))
+# Por quanto tempo um resultado antigo ainda pode ser servido quando a atualização está lenta ou falhando
+DEFAULT_STALE_TTL_SECONDS = int(os.getenv("CACHE_STALE_TTL_SECONDS", "86400"))
+# Entradas com prazo mantidas no cache em memória; as mais antigas (LRU) são descartadas acima do limite
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+# A cada quantas gravações as entradas expiradas são removidas (chaves de versões antigas nunca são lidas de novo)
+CACHE_PURGE_INTERVAL_WRITES = int(os.getenv("CACHE_PURGE_INTERVAL_WRITES", "500"))
+
+# --- Backends ---
+
+class MemoryCacheBackend:
+    """
+    Cache em memória do processo. Adequado para uma única réplica ou desenvolvimento local.
+    Entradas expiradas são removidas periodicamente e, acima de `max_entries`, as entradas com prazo
+    usadas há mais tempo são descartadas. Chaves sem prazo (versões e saldos) nunca são descartadas:
+    perder uma versão tornaria entradas antigas alcançáveis de novo.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, purge_interval_writes: int = CACHE_PURGE_INTERVAL_WRITES):
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+        self._purge_interval_writes = purge_interval_writes
+        self._writes = 0
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: int = None):
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            self._after_write()
+
+    def _after_write(self):
+        """Remove as entradas expiradas a cada N gravações e aplica o limite de entradas (com o lock adquirido)."""
+        self._writes += 1
+        if self._writes % self._purge_interval_writes == 0:
+            now = time.time()
+            for key in [k for k, (_, expires_at) in self._data.items() if expires_at is not None and expires_at < now]:
+                del self._data[key]
+
+        excess = len(self._data) - self._max_entries
+        if excess > 0:
+            victims = []
+            for key, (_, expires_at) in self._data.items(): # Da menos para a mais recentemente usada
+                if expires_at is not None:
+                    victims.append(key)
+                    if len(victims) == excess:
+                        break
+            for key in victims:
+                del self._data[key]
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        with self._lock:
+            value, expires_at = self._data.get(key, ("0", None))
+            new_value = int(value) + amount
+            self._data[key] = (str(new_value), expires_at)
+            return new_value
+
+    def incr_float(self, key: str, amount: float) -> float:
+        with self._lock:
+            value, expires_at = self._data.get(key, ("0", None))
+            new_value = float(value) + amount
+            self._data[key] = (repr(new_value), expires_at)
+            return new_value
+
+    def set_many(self, mapping: dict, ttl: int = None):
+        for key, value in mapping.items():
+            self.set(key, value, ttl)
+
+
+class RedisCacheBackend:
+    """Cache compartilhado entre réplicas em um servidor compatível com Redis."""
+
+    def __init__(self, url: str):
+        try:
+            import redis # Dependência opcional, só necessária com CACHE_BACKEND=redis
+        except ImportError as e:
+            raise ValueError("CACHE_BACKEND=redis requer o pacote 'redis' instalado.") from e
+        self._client = redis.Redis.from_url(url, decode_responses=True)
+
+    def get(self, key: str):
+        return self._client.get(key)
+
+    def set(self, key: str, value: str, ttl: int = None):
+        self._client.set(key, value, ex=ttl)
+
+    def delete(self, key: str):
+        self._client.delete(key)
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        return int(self._client.incr(key, amount))
+
+    def incr_float(self, key: str, amount: float) -> float:
+        return float(self._client.incrbyfloat(key, amount))
+
+    def set_many(self, mapping: dict, ttl: int = None):
+        pipeline = self._client.pipeline(transaction=False)
+        for key, value in mapping.items():
+            pipeline.set(key, value, ex=ttl)
+        pipeline.execute()
+
+
+class SQLiteCacheBackend:
+    """
+    Cache em arquivo SQLite. Compartilhado entre processos da mesma máquina;
+    útil em testes e em implantações sem Redis.
+    """
+
+    def __init__(self, path: str, purge_interval_writes: int = CACHE_PURGE_INTERVAL_WRITES):
+        self._path = path
+        self._purge_interval_writes = purge_interval_writes
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # Uma conexão por operação: seguro entre threads e processos
+        conn = sqlite3.connect(self._path, timeout=5, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def get(self, key: str):
+        with self._connect() as conn:
+            row = conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is not None and expires_at < time.time():
+            self.delete(key)
+            return None
+        return value
+
+    def set(self, key: str, value: str, ttl: int = None):
+        expires_at = time.time() + ttl if ttl else None
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO cache (key, value, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+                (key, value, expires_at)
+            )
+        self._purge_expired_periodically()
+
+    def _purge_expired_periodically(self):
+        """Remove as entradas expiradas a cada N gravações; as de versões antigas nunca são lidas (e apagadas) de novo."""
+        with self._writes_lock:
+            self._writes += 1
+            if self._writes % self._purge_interval_writes != 0:
+                return
+        with self._connect() as conn:
+            conn.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+
+    def delete(self, key: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def set_many(self, mapping: dict, ttl: int = None):
+        expires_at = time.time() + ttl if ttl else None
+        with self._connect() as conn:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT INTO cache (key, value, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+                [(key, value, expires_at) for key, value in mapping.items()]
+            )
+            conn.execute("COMMIT")
+        self._purge_expired_periodically()
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        return self._add(key, amount, int)
+
+    def incr_float(self, key: str, amount: float) -> float:
+        return self._add(key, amount, float)
+
+    def _add(self, key: str, amount, number_type):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+                new_value = (number_type(row[0]) if row else number_type(0)) + amount
+                conn.execute(
+                    "INSERT INTO cache (key, value, expires_at) VALUES (?, ?, NULL) "
+                    "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                    (key, str(new_value))
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return new_value
+
+
+_cache_backend = None
+
+def get_cache_backend():
+    """
+    Retorna uma instância singleton do backend de cache, escolhido pela variável CACHE_BACKEND:
+    'memory' (padrão), 'redis' (usa REDIS_URL) ou 'sqlite' (usa CACHE_SQLITE_PATH).
+    """
+    global _cache_backend
+    if _cache_backend is None:
+        backend_name = os.getenv("CACHE_BACKEND", "memory").lower()
+        if backend_name == "memory":
+            _cache_backend = MemoryCacheBackend()
+        elif backend_name == "redis":
+            _cache_backend = RedisCacheBackend(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+        elif backend_name == "sqlite":
+            _cache_backend = SQLiteCacheBackend(os.getenv("CACHE_SQLITE_PATH", "estoque_cache.sqlite3"))
+        else:
+            raise ValueError(f"CACHE_BACKEND inválido: '{backend_name}'. Use 'memory', 'redis' ou 'sqlite'.")
+    return _cache_backend
+
+# --- Chaves versionadas e invalidação ---
+
+def _version_key(namespace: str) -> str:
+    return f"estoque:versao:{namespace}"
+
+def _namespace_versions(backend, namespaces) -> str:
+    return ",".join(f"{ns}={backend.get(_version_key(ns)) or 0}" for ns in namespaces)
+
+def invalidate(*namespaces: str):
+    """
+    Invalida todas as entradas que dependem dos namespaces informados incrementando suas versões.
+    Como a versão fica no backend, a invalidação vale para todas as réplicas que o compartilham.
+    """
+    backend = get_cache_backend()
+    for namespace in namespaces:
+        try:
+            backend.incr(_version_key(namespace))
+        except Exception as e:
+            logger.warning("Falha ao invalidar cache '%s': %s", namespace, e)
+
+class CacheResult(NamedTuple):
+    """
+    Resultado de uma leitura com cache. `stale` indica valor antigo servido enquanto a atualização ocorre;
+    `degraded` indica que ele foi servido porque a consulta estourou o prazo, falhou ou o disjuntor estava aberto.
+    """
+    value: Any
+    stale: bool
+    fetched_at: float
+    degraded: bool = False
+
+
+_revalidation_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="estoque-revalidate")
+_revalidating = set()
+_revalidating_lock = threading.Lock()
+
+def cached(*namespaces: str, ttl: int = DEFAULT_TTL_SECONDS, stale_ttl: int = DEFAULT_STALE_TTL_SECONDS):
+    """
+    Decorador para funções de acesso a dados. O resultado (serializável em JSON) é guardado no backend
+    sob uma chave que inclui a versão atual de cada namespace; `invalidate(namespace)` torna as entradas
+    antigas inalcançáveis. Exceções da função não são cacheadas. Falhas do backend apenas desativam o cache.
+
+    Leituras seguem stale-while-revalidate: entre `ttl` e `2 * ttl` segundos o valor ainda é servido (marcado como
+    antigo) enquanto é recalculado em segundo plano; depois disso a entrada expira no backend. Consultas ao banco têm prazo (QUERY_DEADLINE_SECONDS) e passam
+    pelo disjuntor do banco; se o prazo estourar ou a consulta falhar, o último resultado bom (até `stale_ttl`
+    segundos, mesmo de versões anteriores, guardado em uma única chave sem versão) é servido no lugar. `func.fetch(...)` retorna um `CacheResult`;
+    chamar `func(...)` retorna apenas o valor.
+    """
+    def decorator(func):
+        func_name = f"{func.__module__}.{func.__qualname__}"
+        signature = inspect.signature(func)
+
+        def args_digest(args, kwargs) -> str:
+            # Normaliza argumentos posicionais/nomeados e padrões para que chamadas equivalentes compartilhem a chave
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return hashlib.sha1(repr(sorted(bound.arguments.items())).encode()).hexdigest()
+
+        def build_key(backend, digest) -> str:
+            return f"estoque:cache:{func_name}:{_namespace_versions(backend, namespaces)}:{digest}"
+
+        def last_good_key(digest) -> str:
+            return f"estoque:ultimo:{func_name}:{digest}"
+
+        def load(backend, key):
+            try:
+                raw_value = backend.get(key)
+            except Exception as e:
+                logger.warning("Cache indisponível para %s: %s", func_name, e)
+                return None
+            return json.loads(raw_value) if raw_value is not None else None
+
+        def store(backend, key, digest, value):
+            entry = json.dumps({"valor": value, "em": time.time()})
+            try:
+                if key is not None:
+                    # A chave versionada só precisa durar a janela de revalidação; apenas a do último resultado bom
+                    # (uma por argumento, sobrescrita a cada gravação) fica até `stale_ttl`
+                    backend.set(key, entry, 2 * ttl)
+                backend.set(last_good_key(digest), entry, stale_ttl)
+            except Exception as e:
+                logger.warning("Falha ao gravar cache de %s: %s", func_name, e)
+
+        def compute_with_deadline(backend, key, digest, args, kwargs):
+            """Executa a consulta com prazo e disjuntor, publicando o resultado mesmo se chegar após o prazo."""
+            breaker = get_database_circuit_breaker()
+            if not breaker.allow_request():
+                raise CircuitOpenError("Banco de dados indisponível no momento; novas tentativas em instantes.")
+
+            timed_out = threading.Event()
+
+            def on_done(future):
+                if future.cancelled() or future.exception() is not None:
+                    # Após o prazo a falha já foi contada; contar de novo abriria o circuito com metade das falhas
+                    if not timed_out.is_set():
+                        breaker.record_failure()
+                    return
+                # Consultas que só terminam após o prazo já contaram como falha: não fecham o circuito
+                if not timed_out.is_set():
+                    breaker.record_success()
+                store(backend, key, digest, future.result())
+
+            future = submit_query(func, *args, **kwargs)
+            future.add_done_callback(on_done)
+            try:
+                return future.result(timeout=QUERY_DEADLINE_SECONDS)
+            except FutureTimeoutError:
+                timed_out.set()
+                breaker.record_failure()
+                raise DeadlineExceededError(f"A consulta excedeu o prazo de {QUERY_DEADLINE_SECONDS:g}s.") from None
+
+        def revalidate_in_background(backend, key, digest, args, kwargs):
+            with _revalidating_lock:
+                if key in _revalidating:
+                    return
+                _revalidating.add(key)
+
+            def run():
+                try:
+                    compute_with_deadline(backend, key, digest, args, kwargs)
+                except Exception as e:
+                    logger.info("Revalidação de %s falhou: %s", func_name, e)
+                finally:
+                    with _revalidating_lock:
+                        _revalidating.discard(key)
+            _revalidation_executor.submit(run)
+
+        def fetch(*args, **kwargs) -> CacheResult:
+            backend = get_cache_backend()
+            digest = args_digest(args, kwargs)
+            try:
+                key = build_key(backend, digest)
+            except Exception as e:
+                logger.warning("Cache indisponível para %s: %s", func_name, e)
+                key = None
+
+            entry = load(backend, key) if key else None
+            if entry is not None:
+                if time.time() - entry["em"] < ttl:
+                    return CacheResult(entry["valor"], False, entry["em"])
+                if not in_query_worker():
+                    revalidate_in_background(backend, key, digest, args, kwargs)
+                    return CacheResult(entry["valor"], True, entry["em"])
+
+            if in_query_worker():
+                # Chamada aninhada dentro de outra consulta: o prazo e o disjuntor já valem para a chamada externa
+                value = func(*args, **kwargs)
+                if key:
+                    store(backend, key, digest, value)
+                return CacheResult(value, False, time.time())
+
+            try:
+                value = compute_with_deadline(backend, key, digest, args, kwargs)
+                return CacheResult(value, False, time.time())
+            except Exception:
+                last_good = load(backend, last_good_key(digest))
+                if last_good is None:
+                    raise
+                logger.warning("Servindo resultado anterior de %s após falha ou lentidão da consulta.", func_name)
+                return CacheResult(last_good["valor"], True, last_good["em"], degraded=True)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return fetch(*args, **kwargs).value
+
+        def refresh(*args, **kwargs):
+            """Recalcula o valor ignorando o cache e publica o resultado para os próximos leitores."""
+            backend = get_cache_backend()
+            digest = args_digest(args, kwargs)
+            key = build_key(backend, digest)
+            return compute_with_deadline(backend, key, digest, args, kwargs)
+
+        wrapper.fetch = fetch
+        wrapper.refresh = refresh
+        return wrapper
+    return decorator
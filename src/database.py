@@ -17,3 +17,19 @@ def get_supabase_client() -> Client:
             raise ValueError("Variáveis de ambiente SUPABASE_URL e SUPABASE_KEY não configuradas.")
         _supabase_client = create_client(supabase_url, supabase_key)
     return _supabase_client
+
+def fetch_all_rows(build_query, page_size: int = 1000) -> list:
+    """
+    Executa uma consulta paginando com `.range()` até trazer todas as linhas.
+    O PostgREST limita cada resposta (1000 linhas por padrão), então `build_query`
+    deve ser uma função que devolve uma consulta nova a cada página.
+    """
+    rows = []
+    offset = 0
+    while True:
+        response = build_query().range(offset, offset + page_size - 1).execute()
+        page = response.data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        offset += page_size
@@ -0,0 +1,42 @@
+# src/date_utils.py
+import os
+from datetime import date, datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+# Fuso em que as datas escolhidas na interface são interpretadas. Deve ser o mesmo configurado
+# em `estoque.timezone` no banco (ver migrations/002), usado para agrupar as agregações por dia.
+APP_TIMEZONE = ZoneInfo(os.getenv("APP_TIMEZONE", "UTC"))
+
+def today() -> date:
+    """Data de hoje no fuso da aplicação (não no fuso do servidor)."""
+    return datetime.now(APP_TIMEZONE).date()
+
+def start_of_day(day: date) -> datetime:
+    """Retorna o início (00:00) do dia no fuso da aplicação, como datetime com fuso."""
+    return datetime.combine(day, time.min, tzinfo=APP_TIMEZONE)
+
+def to_utc_timestamp(moment: datetime) -> str:
+    """Formata um datetime com fuso como timestamp ISO 8601 em UTC (sufixo 'Z'), aceito pelo PostgREST."""
+    return moment.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def day_to_timestamp(day: date) -> str:
+    """Timestamp de gravação para um movimento/remessa datado em `day` (início do dia no fuso da aplicação)."""
+    return to_utc_timestamp(start_of_day(day))
+
+def day_range_bounds(start_date: date = None, end_date: date = None):
+    """
+    Converte um intervalo de dias inclusivo em limites de timestamp semiabertos [início, fim),
+    ambos em UTC. Extremos não informados retornam None.
+    """
+    lower = to_utc_timestamp(start_of_day(start_date)) if start_date else None
+    upper = to_utc_timestamp(start_of_day(end_date + timedelta(days=1))) if end_date else None
+    return lower, upper
+
+def filter_day_range(query, column: str, start_date: date = None, end_date: date = None):
+    """Aplica à consulta o filtro `column >= início AND column < fim` para o intervalo de dias informado."""
+    lower, upper = day_range_bounds(start_date, end_date)
+    if lower:
+        query = query.gte(column, lower)
+    if upper:
+        query = query.lt(column, upper)
+    return query
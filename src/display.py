@@ -0,0 +1,88 @@
+# src/display.py
+import os
+import sys
+import streamlit as st
+import pandas as pd
+from datetime import datetime
+from src.date_utils import APP_TIMEZONE
+
+# Formatos aplicados pelo navegador via `st.column_config`: as colunas continuam numéricas/datetime no DataFrame
+CURRENCY_FORMAT = "R$ %,.2f"
+QUANTITY_FORMAT = "%,.2f"
+DATETIME_FORMAT = "DD/MM/YYYY HH:mm:ss" # Sintaxe do moment.js, usada pelo DatetimeColumn
+
+# Memória máxima que cada sessão pode guardar no session_state. DataFrames não são guardados na sessão:
+# são montados a cada rerun a partir do cache compartilhado entre sessões e descartados em seguida.
+SESSION_MEMORY_LIMIT_MB = float(os.getenv("SESSION_MEMORY_LIMIT_MB", "8"))
+
+def render_stale_notice(result, label: str):
+    """
+    Avisa na interface quando `result` (um CacheResult) é um valor antigo. A falha ou lentidão do banco gera um alerta;
+    a simples expiração do prazo do cache, revalidada em segundo plano, só gera uma nota discreta.
+    """
+    if not result.stale:
+        return
+    fetched_at = datetime.fromtimestamp(result.fetched_at, APP_TIMEZONE).strftime('%d/%m/%Y %H:%M:%S')
+    if result.degraded:
+        st.warning(f"⏳ {label}: exibindo dados de {fetched_at}. O banco está lento ou indisponível; a atualização continua em segundo plano.")
+    else:
+        st.caption(f"🔄 {label}: dados de {fetched_at}, atualizando...")
+
+# --- Formatação de tabelas ---
+
+def currency_column(label: str):
+    """Coluna monetária (R$) formatada na exibição, sem converter os valores em texto."""
+    return st.column_config.NumberColumn(label, format=CURRENCY_FORMAT)
+
+def quantity_column(label: str):
+    """Coluna de quantidade com duas casas decimais e separador de milhar."""
+    return st.column_config.NumberColumn(label, format=QUANTITY_FORMAT)
+
+def datetime_column(label: str):
+    """Coluna de data/hora no formato dd/mm/aaaa hh:mm:ss, exibida no fuso dos próprios dados."""
+    return st.column_config.DatetimeColumn(label, format=DATETIME_FORMAT)
+
+def to_local_datetimes(values) -> pd.Series:
+    """Converte timestamps (texto ISO em UTC) em datetimes no fuso da aplicação, mantendo o tipo datetime."""
+    return pd.to_datetime(pd.Series(values), utc=True, format='ISO8601').dt.tz_convert(APP_TIMEZONE)
+
+# --- Memória por sessão ---
+
+def estimate_nbytes(value, _seen: set = None) -> int:
+    """
+    Estimativa da memória ocupada por um valor do session_state: DataFrames/Series pelo `memory_usage(deep=True)`,
+    listas, tuplas, conjuntos e dicionários somando seus elementos, e os demais objetos por `sys.getsizeof`.
+    """
+    seen = set() if _seen is None else _seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_nbytes(k, seen) + estimate_nbytes(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_nbytes(item, seen) for item in value)
+    return size
+
+def session_memory_usage() -> int:
+    """Bytes ocupados por tudo o que a sessão atual guarda no session_state (valores de widgets e dados da própria aplicação)."""
+    total = 0
+    for key in list(st.session_state.keys()):
+        try:
+            total += estimate_nbytes(st.session_state[key])
+        except KeyError: # Chave removida durante a contagem
+            continue
+    return total
+
+def session_memory_exceeded() -> bool:
+    """Indica se a sessão atual atingiu SESSION_MEMORY_LIMIT_MB; usado para recusar novos dados na sessão."""
+    return session_memory_usage() >= SESSION_MEMORY_LIMIT_MB * 1024 * 1024
+
+def render_session_memory_usage():
+    """Mostra na barra lateral quanto da memória da sessão está em uso."""
+    used_mb = session_memory_usage() / 1024 / 1024
+    st.sidebar.caption(f"Memória da sessão: {used_mb:,.2f} de {SESSION_MEMORY_LIMIT_MB:,.0f} MB")
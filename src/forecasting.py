@@ -0,0 +1,148 @@
+# src/forecasting.py
+import numpy as np
+import pandas as pd
+from itertools import chain
+import streamlit as st
+from datetime import date, timedelta
+from src.database import get_supabase_client
+from src.cache import cached
+from src.display import render_stale_notice
+from src.stock_manager import fetch_stock_summary
+from src.date_utils import today
+
+SERVICE_LEVELS = {"90%": 1.2816, "95%": 1.6449, "99%": 2.3263} # Nível de serviço -> z da normal padrão
+
+# --- Funções de Interação com o Banco de Dados ---
+
+@cached('movimentos')
+def fetch_daily_exits(start_date: date, end_date: date):
+    """
+    Busca as saídas diárias (tipos `saida_*`) por produto, com cache. A agregação é feita no banco pela função
+    `saidas_diarias_por_produto` (migration 004), que devolve em uma única chamada as colunas produto_id, dias
+    (listas de deslocamentos a partir de `start_date`) e quantidades (listas paralelas). Exceções do banco são propagadas.
+    """
+    supabase = get_supabase_client()
+    response = supabase.rpc('saidas_diarias_por_produto', {"p_inicio": str(start_date), "p_fim": str(end_date)}).execute()
+    return response.data
+
+# --- Cálculo vetorizado (NumPy) ---
+
+def build_demand_matrix(product_ids: list, exits: dict, days: int) -> np.ndarray:
+    """Monta a matriz produtos × dias com a quantidade de saídas; dias sem saída ficam com zero."""
+    demand = np.zeros((len(product_ids), days))
+    if not exits['produto_id']:
+        return demand
+
+    lengths = np.fromiter((len(product_days) for product_days in exits['dias']), dtype=int, count=len(exits['dias']))
+    total = int(lengths.sum())
+    product_index = np.repeat(pd.Index(product_ids).get_indexer(exits['produto_id']), lengths)
+    day_index = np.fromiter(chain.from_iterable(exits['dias']), dtype=int, count=total)
+    quantities = np.fromiter(chain.from_iterable(exits['quantidades']), dtype=float, count=total)
+
+    valid = (product_index >= 0) & (day_index >= 0) & (day_index < days) # Ignora produtos removidos
+    np.add.at(demand, (product_index[valid], day_index[valid]), quantities[valid])
+    return demand
+
+def forecast_demand(demand: np.ndarray, window: int, alpha: float):
+    """
+    Calcula, para todos os produtos de uma vez, a média móvel dos últimos `window` dias, a previsão por
+    suavização exponencial (média ponderada com pesos alpha·(1-alpha)^k, normalizados) e o desvio padrão
+    diário na janela. Retorna três vetores com um valor por produto.
+    """
+    days = demand.shape[1]
+    recent = demand[:, -window:]
+    moving_average = recent.mean(axis=1)
+    daily_std = recent.std(axis=1)
+
+    weights = alpha * (1 - alpha) ** np.arange(days - 1, -1, -1)
+    smoothed = demand @ (weights / weights.sum())
+    return moving_average, smoothed, daily_std
+
+def compute_reorder_points(balances: np.ndarray, velocity: np.ndarray, daily_std: np.ndarray, lead_time_days: int, z: float):
+    """Retorna (dias de cobertura, estoque de segurança, ponto de reposição) para cada produto."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_of_cover = np.where(velocity > 0, balances / velocity, np.inf)
+    safety_stock = z * daily_std * np.sqrt(lead_time_days)
+    reorder_point = velocity * lead_time_days + safety_stock
+    return days_of_cover, safety_stock, reorder_point
+
+def build_reorder_forecast(summary: list, exits: dict, days: int, window: int, alpha: float, lead_time_days: int, z: float) -> pd.DataFrame:
+    """Combina saldos e saídas diárias em uma tabela de previsão por produto, ordenada pela cobertura."""
+    df = pd.DataFrame(summary, columns=['produto_id', 'nome_produto', 'unidade_medida', 'saldo_atual'])
+    demand = build_demand_matrix(df['produto_id'].tolist(), exits, days)
+    moving_average, smoothed, daily_std = forecast_demand(demand, window, alpha)
+    balances = df['saldo_atual'].to_numpy(dtype=float)
+    days_of_cover, safety_stock, reorder_point = compute_reorder_points(balances, smoothed, daily_std, lead_time_days, z)
+
+    df = df.assign(
+        consumo_media_movel=moving_average,
+        consumo_previsto=smoothed,
+        dias_cobertura=days_of_cover,
+        estoque_seguranca=safety_stock,
+        ponto_reposicao=reorder_point,
+        repor=(smoothed > 0) & (balances <= reorder_point)
+    )
+    return df.sort_values('dias_cobertura', kind='stable')
+
+# --- Funções de Renderização da UI ---
+
+def render_reorder_forecast_section():
+    """Renderiza a previsão de consumo, dias de cobertura e a lista de alertas de reposição."""
+    st.header("🔮 Previsão de Consumo e Reposição")
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        history_days = st.slider("Histórico (dias)", min_value=28, max_value=365, value=90, step=7, key="forecast_history_days",
+                                 help="Quantos dias de saídas são usados na previsão.")
+        window = st.selectbox("Janela da Média Móvel (dias)", [7, 14, 28], index=1, key="forecast_window")
+    with col2:
+        alpha = st.slider("Suavização Exponencial (alfa)", min_value=0.05, max_value=0.8, value=0.2, step=0.05, key="forecast_alpha",
+                          help="Valores maiores dão mais peso às saídas recentes.")
+        lead_time_days = st.number_input("Prazo de Reposição (dias)", min_value=1, value=7, step=1, key="forecast_lead_time",
+                                         help="Tempo entre o pedido e a chegada do produto.")
+    with col3:
+        service_level = st.selectbox("Nível de Serviço", list(SERVICE_LEVELS.keys()), index=1, key="forecast_service_level",
+                                     help="Probabilidade desejada de não faltar estoque durante o prazo de reposição.")
+
+    end_date = today()
+    start_date = end_date - timedelta(days=history_days - 1)
+    try:
+        with st.spinner("Calculando previsões..."):
+            summary_result = fetch_stock_summary.fetch(None, end_date)
+            exits_result = fetch_daily_exits.fetch(start_date, end_date)
+    except Exception as e:
+        st.error(f"Erro ao carregar dados para a previsão: {e}")
+        return
+    render_stale_notice(summary_result, "Saldos de estoque")
+    render_stale_notice(exits_result, "Saídas diárias")
+
+    if not summary_result.value:
+        st.info("Nenhum produto cadastrado para calcular previsões.")
+        return
+
+    df_forecast = build_reorder_forecast(
+        summary_result.value, exits_result.value, history_days,
+        window, alpha, int(lead_time_days), SERVICE_LEVELS[service_level]
+    )
+    df_display = df_forecast.rename(columns={
+        'nome_produto': 'Produto',
+        'unidade_medida': 'Unidade',
+        'saldo_atual': 'Saldo Atual',
+        'consumo_media_movel': 'Consumo Médio/Dia (MM)',
+        'consumo_previsto': 'Consumo Previsto/Dia',
+        'dias_cobertura': 'Dias de Cobertura',
+        'estoque_seguranca': 'Estoque de Segurança',
+        'ponto_reposicao': 'Ponto de Reposição',
+        'repor': 'Repor'
+    }).drop(columns=['produto_id'])
+
+    df_alerts = df_display[df_display['Repor']]
+    st.subheader(f"Alertas de Reposição ({len(df_alerts)})")
+    if not df_alerts.empty:
+        st.dataframe(df_alerts.drop(columns=['Repor']).round(2), use_container_width=True, hide_index=True)
+    else:
+        st.success("Nenhum produto abaixo do ponto de reposição.")
+
+    st.subheader("Previsão por Produto")
+    st.dataframe(df_display.round(2), use_container_width=True, hide_index=True)
+    st.caption("Dias de cobertura = saldo ÷ consumo previsto; 'inf' indica produto sem saídas no histórico.")
@@ -0,0 +1,95 @@
+# src/precompute.py
+import os
+import time
+import logging
+import threading
+import streamlit as st
+from datetime import datetime, timedelta
+from src.stock_manager import fetch_stock_summary
+from src.shipment_manager import fetch_shipment_totals, RECENT_SHIPMENTS_DAYS
+from src.date_utils import APP_TIMEZONE, today
+
+logger = logging.getLogger(__name__)
+
+PRECOMPUTE_INTERVAL_SECONDS = int(os.getenv("PRECOMPUTE_INTERVAL_SECONDS", "120"))
+
+class DashboardPrecomputer:
+    """
+    Agendador em segundo plano que recalcula periodicamente as visões padrão do painel
+    e publica os resultados no cache, para que o "Resumo de Estoque" seja servido sem espera.
+    """
+
+    def __init__(self, interval_seconds: int = PRECOMPUTE_INTERVAL_SECONDS):
+        self.interval_seconds = interval_seconds
+        self.last_run_at = None
+        self.last_error = None
+        self._run_lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Inicia a thread de pré-cálculo (uma vez por processo). Intervalo <= 0 desativa o agendador."""
+        if self.interval_seconds <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run_forever, name="dashboard-precompute", daemon=True)
+        self._thread.start()
+
+    def run_once(self):
+        """Recalcula o resumo do mês corrente, o saldo até hoje e os totais recentes de remessas."""
+        with self._run_lock:
+            try:
+                current_day = today()
+                fetch_stock_summary.refresh(current_day.replace(day=1), current_day)
+                fetch_stock_summary.refresh(None, current_day)
+                fetch_shipment_totals.refresh(current_day - timedelta(days=RECENT_SHIPMENTS_DAYS), current_day)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                logger.warning("Falha no pré-cálculo do painel: %s", e)
+            finally:
+                self.last_run_at = datetime.now(APP_TIMEZONE)
+
+    @property
+    def scheduler_alive(self) -> bool:
+        """Indica se a thread de pré-cálculo está em execução."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run_forever(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e: # Uma falha inesperada não pode encerrar o agendador
+                self.last_error = str(e)
+                logger.exception("Falha inesperada no agendador de pré-cálculo: %s", e)
+            time.sleep(self.interval_seconds)
+
+
+_precomputer = None
+_precomputer_lock = threading.Lock()
+
+def get_dashboard_precomputer() -> DashboardPrecomputer:
+    """Retorna o agendador singleton do processo, iniciando-o na primeira chamada."""
+    global _precomputer
+    with _precomputer_lock:
+        if _precomputer is None:
+            _precomputer = DashboardPrecomputer()
+            _precomputer.start()
+    return _precomputer
+
+def render_precompute_controls():
+    """Renderiza o status do pré-cálculo e o botão de atualização manual."""
+    precomputer = get_dashboard_precomputer()
+    col_status, col_button = st.columns([3, 1])
+    with col_status:
+        if precomputer.last_run_at:
+            st.caption(f"Dados pré-calculados em {precomputer.last_run_at.strftime('%d/%m/%Y %H:%M:%S')}.")
+        elif precomputer.scheduler_alive:
+            st.caption("Pré-cálculo do painel em andamento...")
+        if precomputer.interval_seconds > 0 and not precomputer.scheduler_alive:
+            st.caption("⚠️ O pré-cálculo em segundo plano está parado; use 'Atualizar Dados' para recalcular o painel.")
+        if precomputer.last_error:
+            st.caption(f"⚠️ Última atualização em segundo plano falhou: {precomputer.last_error}")
+    with col_button:
+        if st.button("🔄 Atualizar Dados", key="precompute_refresh_button"):
+            with st.spinner("Atualizando dados do painel..."):
+                precomputer.run_once()
+            st.rerun()
@@ -1,16 +1,28 @@
 # src/product_manager.py
 import streamlit as st
 import pandas as pd
-from src.database import get_supabase_client
+from src.database import get_supabase_client, fetch_all_rows
+from src.cache import cached, invalidate
+from src.display import render_stale_notice, datetime_column, to_local_datetimes
 from datetime import datetime # Para consistência com created_at
 
+@cached('produtos')
+def fetch_products():
+    """Busca todos os produtos cadastrados (com cache), paginando além do limite de linhas do PostgREST. Exceções do banco são propagadas."""
+    supabase = get_supabase_client()
+
+    def build_query():
+        return supabase.from_('produtos').select('id, nome_produto, unidade_medida, sku, created_at').order('nome_produto').order('id')
+
+    return fetch_all_rows(build_query)
+
 def get_products_data():
     """Busca todos os produtos cadastrados."""
-    supabase = get_supabase_client()
     try:
         with st.spinner("Carregando produtos..."): # Feedback de carregamento
-            response = supabase.from_('produtos').select('id, nome_produto, unidade_medida, sku, created_at').order('nome_produto').execute()
-        return response.data
+            result = fetch_products.fetch()
+        render_stale_notice(result, "Produtos")
+        return result.value
     except Exception as e:
         st.error(f"Erro ao carregar produtos: {e}")
         return []
@@ -24,6 +36,7 @@ def insert_new_product(nome_produto: str, unidade_medida: str, sku: str = None):
     try:
         with st.spinner(f"Cadastrando produto '{nome_produto}'..."): # Feedback de carregamento
             response = supabase.from_('produtos').insert(data).execute()
+        invalidate('produtos')
         return response.data
     except Exception as e:
         # Erro mais específico para nome duplicado (UNIQUE constraint)
@@ -44,8 +57,8 @@ def render_product_management_section():
         products = get_products_data()
         if products:
             df_products = pd.DataFrame(products)
-            # Formatação da data de criação
-            df_products['created_at'] = pd.to_datetime(df_products['created_at']).dt.strftime('%d/%m/%Y %H:%M:%S')
+            # Data de criação no fuso da aplicação (formatada na exibição)
+            df_products['created_at'] = to_local_datetimes(df_products['created_at'])
             df_products = df_products.rename(columns={
                 'nome_produto': 'Produto',
                 'unidade_medida': 'Unidade',
@@ -55,7 +68,10 @@ def render_product_management_section():
             })
             # Selecionar colunas e ordem para melhor visualização (especialmente em mobile)
             display_columns = ['Produto', 'Unidade', 'SKU', 'Data Cadastro']
-            st.dataframe(df_products[display_columns], use_container_width=True, hide_index=True)
+            st.dataframe(
+                df_products[display_columns], use_container_width=True, hide_index=True,
+                column_config={'Data Cadastro': datetime_column('Data Cadastro')}
+            )
             st.info(f"Total de produtos cadastrados: **{len(products)}**")
         else:
             st.info("Nenhum produto cadastrado ainda. Use a aba 'Cadastrar Novo Produto' para começar.")
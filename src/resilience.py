@@ -0,0 +1,95 @@
+# src/resilience.py
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+QUERY_DEADLINE_SECONDS = float(os.getenv("QUERY_DEADLINE_SECONDS", "8"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+QUERY_WORKERS = int(os.getenv("QUERY_WORKERS", "16"))
+
+
+class DeadlineExceededError(Exception):
+    """A consulta não terminou dentro do prazo e não há resultado anterior para servir."""
+
+
+class CircuitOpenError(Exception):
+    """O circuito está aberto: o backend falhou repetidamente e as consultas estão suspensas."""
+
+
+class CircuitBreaker:
+    """
+    Disjuntor simples: após `failure_threshold` falhas consecutivas abre o circuito por `reset_timeout`
+    segundos; depois permite uma única chamada de teste (meio-aberto) antes de fechar novamente.
+    """
+
+    CLOSED = "fechado"
+    OPEN = "aberto"
+    HALF_OPEN = "meio-aberto"
+
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_timeout: float = CIRCUIT_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def allow_request(self) -> bool:
+        """Indica se uma chamada pode ser feita agora; no estado meio-aberto libera só a chamada de teste."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+_database_breaker = CircuitBreaker("supabase")
+
+def get_database_circuit_breaker() -> CircuitBreaker:
+    """Retorna o disjuntor compartilhado pelas consultas ao Supabase neste processo."""
+    return _database_breaker
+
+# --- Execução com prazo ---
+
+_query_executor = ThreadPoolExecutor(max_workers=QUERY_WORKERS, thread_name_prefix="estoque-query")
+_worker_state = threading.local()
+
+def in_query_worker() -> bool:
+    """Indica se o código atual já roda dentro de uma consulta com prazo (chamadas aninhadas não criam outro prazo)."""
+    return getattr(_worker_state, "active", False)
+
+def submit_query(func, *args, **kwargs):
+    """
+    Executa `func` no pool de consultas e retorna o Future. O chamador aguarda com
+    `future.result(timeout=...)`; se o prazo estourar, a consulta continua e o Future
+    ainda pode ser usado para publicar o resultado quando terminar.
+    """
+    def run():
+        _worker_state.active = True
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _worker_state.active = False
+    return _query_executor.submit(run)
@@ -0,0 +1,191 @@
+# src/shipment_analytics.py
+import io
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+from datetime import date, timedelta
+from src.database import get_supabase_client, fetch_all_rows
+from src.cache import cached
+from src.display import render_stale_notice
+from src.date_utils import APP_TIMEZONE, filter_day_range, today
+
+GRANULARITIES = {"Semana": "W", "Mês": "M"}
+METRICS = {"Receita (R$)": "valor", "Quantidade": "quantidade"}
+
+# --- Funções de Interação com o Banco de Dados ---
+
+@cached('produtos', 'remessas')
+def fetch_shipment_item_facts(start_date: date = None, end_date: date = None):
+    """
+    Busca os itens de remessa do período com data e destino da remessa e nome do produto, com cache.
+    Retorna colunas (dict de listas) em vez de linhas, formato mais compacto no cache e direto para o pandas.
+    Exceções do banco são propagadas.
+    """
+    supabase = get_supabase_client()
+
+    def build_query():
+        query = supabase.from_('itens_remessa').select(
+            'id, quantidade_remetida, subtotal_item, remessas!inner(data_remessa, destino), produtos(nome_produto)'
+        ).order('id')
+        return filter_day_range(query, 'remessas.data_remessa', start_date, end_date)
+
+    rows = fetch_all_rows(build_query)
+    return {
+        "data_remessa": [row['remessas']['data_remessa'] for row in rows],
+        "destino": [row['remessas']['destino'] for row in rows],
+        "produto": [row['produtos']['nome_produto'] if row['produtos'] else 'N/A' for row in rows],
+        "quantidade": [row['quantidade_remetida'] for row in rows],
+        "valor": [row['subtotal_item'] for row in rows]
+    }
+
+# --- Motor de agregação (vetorizado com pandas) ---
+
+def build_facts_frame(facts: dict) -> pd.DataFrame:
+    """Monta o DataFrame de fatos com tipos nativos: datas no fuso da aplicação, categorias e floats."""
+    df = pd.DataFrame(facts)
+    df['data_remessa'] = pd.to_datetime(df['data_remessa'], utc=True, format='ISO8601').dt.tz_convert(APP_TIMEZONE)
+    df['destino'] = df['destino'].astype('category')
+    df['produto'] = df['produto'].astype('category')
+    df['quantidade'] = pd.to_numeric(df['quantidade'], errors='coerce').fillna(0.0)
+    df['valor'] = pd.to_numeric(df['valor'], errors='coerce').fillna(0.0)
+    return df
+
+def add_period_column(df: pd.DataFrame, granularity: str) -> pd.DataFrame:
+    """Adiciona a coluna 'periodo' com o início da semana ou do mês de cada remessa."""
+    local_dates = df['data_remessa'].dt.tz_localize(None)
+    return df.assign(periodo=local_dates.dt.to_period(GRANULARITIES[granularity]).dt.start_time)
+
+def summarize_cube(df: pd.DataFrame) -> pd.DataFrame:
+    """Agrega quantidade e receita por produto × destino × período (cubo exportável)."""
+    return (
+        df.groupby(['periodo', 'destino', 'produto'], observed=True)[['quantidade', 'valor']]
+        .sum()
+        .reset_index()
+    )
+
+def top_n(df: pd.DataFrame, by: str, metric: str, n: int) -> pd.DataFrame:
+    """Retorna os `n` maiores valores de `by` (destino ou produto) segundo a métrica escolhida."""
+    return (
+        df.groupby(by, observed=True)[['quantidade', 'valor']]
+        .sum()
+        .nlargest(n, metric)
+        .reset_index()
+    )
+
+def trend_by(df: pd.DataFrame, by: str, metric: str, keep: list) -> pd.DataFrame:
+    """Série temporal da métrica por período para os valores de `by` em `keep` (os demais somados em 'Outros')."""
+    group = df[by].astype(str).where(df[by].isin(keep), 'Outros')
+    return (
+        df.assign(grupo=group)
+        .groupby(['periodo', 'grupo'])[metric]
+        .sum()
+        .reset_index()
+    )
+
+def pivot_product_destination(df: pd.DataFrame, metric: str) -> pd.DataFrame:
+    """Tabela dinâmica produto × destino com a métrica somada."""
+    return df.pivot_table(index='produto', columns='destino', values=metric, aggfunc='sum', fill_value=0, observed=True)
+
+def to_parquet_bytes(df: pd.DataFrame):
+    """Serializa em Parquet; retorna None se nenhum mecanismo Parquet (pyarrow/fastparquet) estiver instalado."""
+    buffer = io.BytesIO()
+    try:
+        df.to_parquet(buffer, index=False)
+    except ImportError:
+        return None
+    return buffer.getvalue()
+
+# --- Funções de Renderização da UI ---
+
+def render_shipment_analytics_section():
+    """Renderiza as análises de volume e receita de remessas por produto, destino e período."""
+    st.subheader("Análise de Remessas")
+
+    default_end_date = today()
+    default_start_date = default_end_date - timedelta(days=365)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        start_date = st.date_input("Data Inicial (Análise)", value=default_start_date, key="start_date_shipment_analytics")
+    with col2:
+        end_date = st.date_input("Data Final (Análise)", value=default_end_date, key="end_date_shipment_analytics")
+
+    col_gran, col_metric, col_top = st.columns(3)
+    with col_gran:
+        granularity = st.radio("Agrupar por", list(GRANULARITIES.keys()), horizontal=True, key="shipment_analytics_granularity")
+    with col_metric:
+        metric_label = st.radio("Métrica", list(METRICS.keys()), horizontal=True, key="shipment_analytics_metric")
+    with col_top:
+        top_count = st.slider("Top N", min_value=3, max_value=20, value=5, key="shipment_analytics_top_n")
+    metric = METRICS[metric_label]
+
+    try:
+        with st.spinner("Calculando análises de remessas..."):
+            result = fetch_shipment_item_facts.fetch(start_date, end_date)
+    except Exception as e:
+        st.error(f"Erro ao carregar dados para análise: {e}")
+        return
+    render_stale_notice(result, "Análise de remessas")
+
+    if not result.value['data_remessa']:
+        st.info("Nenhum item de remessa no período selecionado.")
+        return
+
+    df_facts = add_period_column(build_facts_frame(result.value), granularity)
+
+    kpi1, kpi2, kpi3 = st.columns(3)
+    with kpi1:
+        st.metric("Receita Total", f"R$ {df_facts['valor'].sum():,.2f}")
+    with kpi2:
+        st.metric("Quantidade Total", f"{df_facts['quantidade'].sum():,.2f}")
+    with kpi3:
+        st.metric("Destinos Atendidos", df_facts['destino'].nunique())
+
+    col_dest, col_prod = st.columns(2)
+    top_destinations = top_n(df_facts, 'destino', metric, top_count)
+    top_products = top_n(df_facts, 'produto', metric, top_count)
+    with col_dest:
+        fig = px.bar(top_destinations, x='destino', y=metric, title=f"Top {top_count} Destinos", labels={'destino': 'Destino', metric: metric_label})
+        st.plotly_chart(fig, use_container_width=True)
+    with col_prod:
+        fig = px.bar(top_products, x='produto', y=metric, title=f"Top {top_count} Produtos", labels={'produto': 'Produto', metric: metric_label})
+        st.plotly_chart(fig, use_container_width=True)
+
+    trend_dimension = st.radio("Tendência por", ["destino", "produto"], format_func=str.capitalize, horizontal=True, key="shipment_analytics_trend_by")
+    keep = (top_destinations if trend_dimension == 'destino' else top_products)[trend_dimension].astype(str).tolist()
+    df_trend = trend_by(df_facts, trend_dimension, metric, keep)
+    fig = px.line(df_trend, x='periodo', y=metric, color='grupo', markers=True,
+                  title=f"{metric_label} por {granularity.lower()}",
+                  labels={'periodo': granularity, metric: metric_label, 'grupo': trend_dimension.capitalize()})
+    st.plotly_chart(fig, use_container_width=True)
+
+    st.markdown("##### Produto × Destino")
+    st.dataframe(pivot_product_destination(df_facts, metric), use_container_width=True)
+
+    # --- Exportação do cubo produto × destino × período ---
+    df_cube = summarize_cube(df_facts).rename(columns={
+        'periodo': 'Período', 'destino': 'Destino', 'produto': 'Produto',
+        'quantidade': 'Quantidade', 'valor': 'Receita'
+    })
+    file_suffix = f"{start_date}_a_{end_date}"
+    col_csv, col_parquet = st.columns(2)
+    with col_csv:
+        st.download_button(
+            label="📊 Exportar Análise (CSV)",
+            data=df_cube.to_csv(index=False, sep=';', decimal=','),
+            file_name=f"analise_remessas_{file_suffix}.csv",
+            mime="text/csv",
+            key="download_shipment_analytics_csv"
+        )
+    with col_parquet:
+        parquet_data = to_parquet_bytes(df_cube)
+        if parquet_data is not None:
+            st.download_button(
+                label="🗄️ Exportar Análise (Parquet)",
+                data=parquet_data,
+                file_name=f"analise_remessas_{file_suffix}.parquet",
+                mime="application/octet-stream",
+                key="download_shipment_analytics_parquet"
+            )
+        else:
+            st.caption("Exportação Parquet indisponível: instale 'pyarrow'.")
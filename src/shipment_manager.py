@@ -1,10 +1,18 @@
 # src/shipment_manager.py
 import streamlit as st
 import pandas as pd
-from src.database import get_supabase_client
+from src.database import get_supabase_client, fetch_all_rows
 from src.product_manager import get_products_data
-from src.stock_manager import insert_stock_movement # Usado para registrar a saída de estoque
-from datetime import datetime, date, timedelta
+from src.stock_manager import insert_stock_movement, get_product_balance, fetch_current_balances # Usados para registrar e validar a saída de estoque
+from src.cache import cached, invalidate
+from src.display import render_stale_notice, currency_column, quantity_column, datetime_column, to_local_datetimes, session_memory_exceeded
+from src.date_utils import day_to_timestamp, filter_day_range, today
+from src.shipment_analytics import render_shipment_analytics_section
+from datetime import date, timedelta
+
+RECENT_SHIPMENTS_DAYS = 30 # Janela dos totais de remessas exibidos no painel
+SHIPMENTS_PAGE_SIZE = 25 # Remessas por página no histórico
+STOCK_TOLERANCE = 1e-9 # Tolerância de arredondamento ao comparar quantidades com o saldo
 
 # --- Funções de Interação com o Banco de Dados ---
 
@@ -18,11 +26,12 @@ def insert_new_shipment(destination: str, shipment_observation: str = None, ship
     if shipment_observation:
         data["observacao_remessa"] = shipment_observation
     if shipment_date:
-        data["data_remessa"] = str(shipment_date) + "T00:00:00Z"
+        data["data_remessa"] = day_to_timestamp(shipment_date)
 
     try:
         with st.spinner("Registrando remessa principal..."):
             response = supabase.from_('remessas').insert(data).execute()
+        invalidate('remessas')
         if response.data and len(response.data) > 0:
             return response.data[0]['id']
         else:
@@ -48,142 +57,240 @@ def insert_shipment_item(remessa_id: str, produto_id: str, quantidade_remetida:
     }
     try:
         response = supabase.from_('itens_remessa').insert(data).execute()
+        invalidate('remessas')
         return response.data
     except Exception as e:
         st.error(f"Erro ao adicionar item à remessa no banco de dados: {e}. Tente novamente.")
         return None
 
-def get_detailed_shipments(start_date: date = None, end_date: date = None):
+@cached('remessas')
+def fetch_shipment_headers(start_date: date = None, end_date: date = None, page: int = 0, page_size: int = SHIPMENTS_PAGE_SIZE):
+    """
+    Busca uma página de cabeçalhos de remessa (data, destino, total e quantidade de itens calculados no banco
+    pela visão `remessas_resumo`), filtrados por data, com cache. Retorna {"remessas": [...], "total": n}.
+    Exceções do banco são propagadas.
+    """
+    supabase = get_supabase_client()
+    query = supabase.from_('remessas_resumo').select(
+        'id, data_remessa, destino, observacao_remessa, total_remessa, total_itens', count='exact'
+    ).order('data_remessa', desc=True).order('id') # Ordem estável para a paginação
+    query = filter_day_range(query, 'data_remessa', start_date, end_date)
+
+    offset = page * page_size
+    response = query.range(offset, offset + page_size - 1).execute()
+    return {"remessas": response.data or [], "total": response.count or 0}
+
+def get_shipment_headers(start_date: date = None, end_date: date = None, page: int = 0):
     """
-    Busca todas as remessas com seus itens detalhados (via join), filtradas por data.
+    Busca uma página de cabeçalhos de remessa filtrados por data (ver `fetch_shipment_headers`).
     """
+    try:
+        with st.spinner("Carregando histórico de remessas..."):
+            result = fetch_shipment_headers.fetch(start_date, end_date, page)
+        render_stale_notice(result, "Histórico de remessas")
+        return result.value
+    except Exception as e:
+        st.error(f"Erro ao carregar remessas: {e}")
+        return {"remessas": [], "total": 0}
+
+@cached('produtos', 'remessas')
+def fetch_shipment_items(remessa_id: str):
+    """Busca os itens de uma única remessa com nome e unidade do produto, com cache. Exceções do banco são propagadas."""
     supabase = get_supabase_client()
+    response = supabase.from_('itens_remessa').select(
+        'id, quantidade_remetida, preco_unitario_na_remessa, subtotal_item, produtos(nome_produto, unidade_medida)'
+    ).eq('remessa_id', remessa_id).order('id').execute()
+
+    items = []
+    for item in response.data or []:
+        items.append({
+            "Produto": item['produtos']['nome_produto'] if item['produtos'] else 'N/A',
+            "Unidade": item['produtos']['unidade_medida'] if item['produtos'] else 'N/A',
+            "Quantidade": float(item['quantidade_remetida']),
+            "Preço Unitário": float(item['preco_unitario_na_remessa']),
+            "Subtotal Item": float(item['subtotal_item'])
+        })
+    return items
+
+def get_shipment_items(remessa_id: str):
+    """Busca os itens de uma remessa (ver `fetch_shipment_items`)."""
     try:
-        with st.spinner("Carregando histórico de remessas..."): # Adicionado spinner
-            query = supabase.from_('remessas').select(
-                """
-                *,
-                itens_remessa(
-                    id,
-                    produto_id,
-                    quantidade_remetida,
-                    preco_unitario_na_remessa,
-                    subtotal_item,
-                    produtos(nome_produto, unidade_medida)
-                )
-                """
-            ).order('data_remessa', desc=True) # Ordena as remessas
-
-            if start_date:
-                query = query.gte('data_remessa', str(start_date))
-            if end_date:
-                end_date_plus_one = end_date + timedelta(days=1)
-                query = query.lt('data_remessa', str(end_date_plus_one))
-
-            response = query.execute()
-
-            processed_data = []
-            if response.data: # Verifica se há dados antes de processar
-                for shipment in response.data:
-                    shipment_total = 0.0
-                    if shipment['itens_remessa']:
-                        for item in shipment['itens_remessa']:
-                            item_subtotal = float(item['subtotal_item']) # Garante que é float para soma
-                            shipment_total += item_subtotal
-                            processed_data.append({
-                                "ID Remessa": shipment['id'],
-                                "Data da Remessa": datetime.fromisoformat(shipment['data_remessa']).strftime('%d/%m/%Y %H:%M:%S'),
-                                "Destino": shipment['destino'],
-                                "Observação da Remessa": shipment['observacao_remessa'],
-                                "Produto": item['produtos']['nome_produto'] if item['produtos'] else 'N/A',
-                                "Unidade": item['produtos']['unidade_medida'] if item['produtos'] else 'N/A',
-                                "Quantidade": float(item['quantidade_remetida']), # Garante que é float
-                                "Preço Unitário": float(item['preco_unitario_na_remessa']), # Garante que é float
-                                "Subtotal Item": item_subtotal,
-                                "Total Remessa": None # Será preenchido no loop externo para cada linha da mesma remessa
-                            })
-                    else: # Caso a remessa não tenha itens (apenas para exibição)
-                        processed_data.append({
-                            "ID Remessa": shipment['id'],
-                            "Data da Remessa": datetime.fromisoformat(shipment['data_remessa']).strftime('%d/%m/%Y %H:%M:%S'),
-                            "Destino": shipment['destino'],
-                            "Observação da Remessa": shipment['observacao_remessa'],
-                            "Produto": "N/A (sem itens)", "Unidade": "", "Quantidade": 0.0,
-                            "Preço Unitário": 0.0, "Subtotal Item": 0.0,
-                            "Total Remessa": 0.0 # Remessa sem itens tem total 0
-                        })
-
-                    # Preenche o Total Remessa para todos os itens daquela remessa ou na linha da própria remessa
-                    # Fazemos isso em um segundo loop para garantir que o total seja calculado antes de ser atribuído
-                    for item_dict in processed_data:
-                        if item_dict["ID Remessa"] == shipment['id'] and item_dict["Total Remessa"] is None:
-                            item_dict["Total Remessa"] = shipment_total
-
-            return processed_data
+        with st.spinner("Carregando itens da remessa..."):
+            result = fetch_shipment_items.fetch(remessa_id)
+        render_stale_notice(result, "Itens da remessa")
+        return result.value
     except Exception as e:
-        st.error(f"Erro ao carregar remessas detalhadas: {e}")
+        st.error(f"Erro ao carregar itens da remessa: {e}")
         return []
 
+@cached('remessas')
+def fetch_shipment_totals(start_date: date = None, end_date: date = None):
+    """
+    Calcula os totais de remessas no período (quantidade de remessas, de itens e valor total), com cache.
+    Usa os totais por remessa já agregados pela visão `remessas_resumo`. Exceções do banco são propagadas.
+    """
+    supabase = get_supabase_client()
+
+    def build_query():
+        query = supabase.from_('remessas_resumo').select('id, total_remessa, total_itens').order('id')
+        return filter_day_range(query, 'data_remessa', start_date, end_date)
+
+    shipments = fetch_all_rows(build_query)
+    return {
+        "total_remessas": len(shipments),
+        "total_itens": sum(int(shipment['total_itens']) for shipment in shipments),
+        "valor_total": sum(float(shipment['total_remessa']) for shipment in shipments)
+    }
+
+def get_available_to_ship(product_id: str, reserved_items: list = None) -> float:
+    """
+    Retorna a quantidade disponível para remessa de um produto: o saldo em cache (tempo constante)
+    menos o que já foi reservado nos itens da remessa em composição (`reserved_items`).
+    """
+    reserved = sum(item['quantidade_remetida'] for item in (reserved_items or []) if item['produto_id'] == product_id)
+    return get_product_balance(product_id) - reserved
+
+def find_items_exceeding_stock(items: list) -> list:
+    """
+    Retorna (nome_produto, quantidade_total, saldo) dos produtos cuja quantidade somada nos itens excede o saldo.
+    Usada ao finalizar a remessa: o saldo vem das agregações no banco, não do cache de saldos.
+    """
+    totals_by_product = {}
+    for item in items:
+        name, quantity = totals_by_product.get(item['produto_id'], (item['nome_produto'], 0.0))
+        totals_by_product[item['produto_id']] = (name, quantity + item['quantidade_remetida'])
+
+    balances = fetch_current_balances(list(totals_by_product))
+    shortages = []
+    for product_id, (name, quantity) in totals_by_product.items():
+        balance = balances[product_id]
+        if quantity > balance + STOCK_TOLERANCE:
+            shortages.append((name, quantity, balance))
+    return shortages
+
 # --- Funções de Renderização da UI ---
 
+def render_recent_shipments_summary(days: int = RECENT_SHIPMENTS_DAYS):
+    """Renderiza os totais de remessas dos últimos `days` dias (servidos pelo cache pré-calculado)."""
+    end_date = today()
+    start_date = end_date - timedelta(days=days)
+    st.subheader(f"Remessas nos Últimos {days} Dias")
+    try:
+        result = fetch_shipment_totals.fetch(start_date, end_date)
+    except Exception as e:
+        st.error(f"Erro ao carregar totais de remessas: {e}")
+        return
+    render_stale_notice(result, "Totais de remessas")
+    totals = result.value
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric(label="Remessas", value=totals['total_remessas'])
+    with col2:
+        st.metric(label="Itens Remetidos", value=totals['total_itens'])
+    with col3:
+        st.metric(label="Valor Total", value=f"R$ {totals['valor_total']:,.2f}")
+
+def _reset_shipments_page():
+    """Volta o histórico de remessas para a primeira página quando o filtro de datas muda."""
+    st.session_state["shipments_page"] = 1
+
 def render_shipment_management_section():
     """Renderiza a interface para o registro e visualização de remessas com filtros de data."""
     st.header("🚚 Gerenciamento de Remessas") # Título mais visível
 
-    tab1, tab2 = st.tabs(["Visualizar Remessas", "Registrar Nova Remessa"])
+    tab1, tab2, tab3 = st.tabs(["Visualizar Remessas", "Registrar Nova Remessa", "Análises"])
 
     # Definir um período padrão para os filtros de data
-    default_start_date = datetime.now().date().replace(day=1) # Primeiro dia do mês atual
-    default_end_date = datetime.now().date() # Data de hoje
+    default_start_date = today().replace(day=1) # Primeiro dia do mês atual
+    default_end_date = today() # Data de hoje
 
     with tab1:
-        st.subheader("Histórico Detalhado de Remessas")
+        st.subheader("Histórico de Remessas")
         col1, col2 = st.columns(2)
         with col1:
             start_date_shipments = st.date_input(
                 "Data Inicial (Remessas)",
                 value=default_start_date,
                 key="start_date_shipments_view",
-                help="Filtra as remessas a partir desta data."
+                help="Filtra as remessas a partir desta data.",
+                on_change=_reset_shipments_page
             )
         with col2:
             end_date_shipments = st.date_input(
                 "Data Final (Remessas)",
                 value=default_end_date,
                 key="end_date_shipments_view",
-                help="Filtra as remessas até esta data."
+                help="Filtra as remessas até esta data.",
+                on_change=_reset_shipments_page
+            )
+
+        page_number = st.session_state.get("shipments_page", 1)
+        headers_page = get_shipment_headers(start_date_shipments, end_date_shipments, page_number - 1)
+        total_pages = max(1, -(-headers_page['total'] // SHIPMENTS_PAGE_SIZE))
+        if page_number > total_pages: # Remessas removidas desde a última página exibida
+            page_number = 1
+            st.session_state["shipments_page"] = 1
+            headers_page = get_shipment_headers(start_date_shipments, end_date_shipments, 0)
+
+        if headers_page['remessas']:
+            df_shipments = pd.DataFrame(headers_page['remessas'])
+            df_shipments['data_remessa'] = to_local_datetimes(df_shipments['data_remessa'])
+            df_shipments['total_remessa'] = df_shipments['total_remessa'].astype(float)
+            df_shipments = df_shipments.rename(columns={
+                'data_remessa': 'Data da Remessa',
+                'destino': 'Destino',
+                'total_itens': 'Itens',
+                'total_remessa': 'Total Remessa',
+                'observacao_remessa': 'Observação'
+            })
+
+            display_columns = ['Data da Remessa', 'Destino', 'Itens', 'Total Remessa', 'Observação']
+            st.dataframe(
+                df_shipments[display_columns], use_container_width=True, hide_index=True,
+                column_config={
+                    'Data da Remessa': datetime_column('Data da Remessa'),
+                    'Total Remessa': currency_column('Total Remessa')
+                }
             )
 
-        shipments_data = get_detailed_shipments(start_date=start_date_shipments, end_date=end_date_shipments)
-        if shipments_data:
-            df_shipments = pd.DataFrame(shipments_data)
-            df_shipments = df_shipments.sort_values(by=["Data da Remessa", "Destino", "Produto"], ascending=[False, True, True])
-
-            # Formatação de valores monetários
-            df_shipments['Preço Unitário'] = df_shipments['Preço Unitário'].apply(lambda x: f"R$ {x:,.2f}")
-            df_shipments['Subtotal Item'] = df_shipments['Subtotal Item'].apply(lambda x: f"R$ {x:,.2f}")
-            df_shipments['Total Remessa'] = df_shipments['Total Remessa'].apply(lambda x: f"R$ {x:,.2f}")
-
-            # IDs da Remessa só aparecem na primeira linha do grupo para clareza
-            df_shipments['ID Remessa Exibição'] = df_shipments['ID Remessa'].mask(df_shipments['ID Remessa'].duplicated(), "")
-
-            # Colunas para exibição otimizada para mobile
-            display_columns = [
-                'ID Remessa Exibição', 'Data da Remessa', 'Destino', 'Produto',
-                'Quantidade', 'Unidade', 'Preço Unitário', 'Subtotal Item', 'Total Remessa'
-            ]
-
-            st.dataframe(df_shipments[display_columns], use_container_width=True, hide_index=True)
-            st.info(f"Total de remessas no período: **{len(df_shipments['ID Remessa'].unique())}** (com **{len(df_shipments)}** itens).")
-            st.markdown(
-                """
-                <small>As tabelas podem requerer rolagem horizontal em dispositivos móveis com muitas colunas.
-                O 'Total Remessa' se repete para cada item da mesma remessa para fins de visualização agrupada.</small>
-                """, unsafe_allow_html=True
+            col_page, col_info = st.columns([1, 3])
+            with col_page:
+                st.number_input("Página", min_value=1, max_value=total_pages, step=1, key="shipments_page")
+            with col_info:
+                st.info(f"Total de remessas no período: **{headers_page['total']}** (página {page_number} de {total_pages}).")
+
+            # Itens são buscados apenas para a remessa escolhida (rótulos só para as linhas da página)
+            shipment_labels = {
+                row['id']: f"{row['Data da Remessa']:%d/%m/%Y %H:%M:%S} — {row['Destino']} ({row['id'][:8]})"
+                for row in df_shipments[['id', 'Data da Remessa', 'Destino']].to_dict('records')
+            }
+            selected_shipment_id = st.selectbox(
+                "Ver itens da remessa",
+                [None] + list(shipment_labels.keys()),
+                format_func=lambda shipment_id: "Selecione uma remessa..." if shipment_id is None else shipment_labels[shipment_id],
+                key="shipment_items_select",
+                help="Os itens são carregados somente para a remessa selecionada."
             )
+            if selected_shipment_id:
+                shipment_items = get_shipment_items(selected_shipment_id)
+                if shipment_items:
+                    st.dataframe(
+                        pd.DataFrame(shipment_items), use_container_width=True, hide_index=True,
+                        column_config={
+                            'Quantidade': quantity_column('Quantidade'),
+                            'Preço Unitário': currency_column('Preço Unitário'),
+                            'Subtotal Item': currency_column('Subtotal Item')
+                        }
+                    )
+                else:
+                    st.info("Esta remessa não possui itens.")
         else:
             st.info("Nenhuma remessa registrada no período selecionado.")
 
+    with tab3: # Renderizada antes da aba 2, que pode encerrar a função com `return`
+        render_shipment_analytics_section()
+
     with tab2:
         st.subheader("Registrar Nova Remessa")
         st.info("Você pode adicionar múltiplos itens a uma única remessa. Clique 'Adicionar Item' para cada produto.")
@@ -243,8 +350,20 @@ def render_shipment_management_section():
                     st.warning("A quantidade do item deve ser maior que zero.")
                     return
 
+                if session_memory_exceeded(): # Os itens ficam no session_state até a remessa ser finalizada
+                    st.error("Limite de memória da sessão atingido. Finalize ou limpe a remessa atual antes de adicionar mais itens.")
+                    return
+
                 product_id_item = products_dict.get(selected_product_name_item)
                 if product_id_item:
+                    try:
+                        available = get_available_to_ship(product_id_item, st.session_state.current_shipment_items)
+                    except Exception as e:
+                        st.error(f"Erro ao consultar o estoque disponível: {e}")
+                        return
+                    if quantity_item > available + STOCK_TOLERANCE:
+                        st.error(f"Estoque insuficiente para '{selected_product_name_item}': disponível {max(available, 0.0):,.2f}, solicitado {quantity_item:,.2f}.")
+                        return
                     st.session_state.current_shipment_items.append({
                         "produto_id": product_id_item,
                         "nome_produto": selected_product_name_item,
@@ -252,7 +371,7 @@ def render_shipment_management_section():
                         "preco_unitario_na_remessa": price_unit_item,
                         "subtotal_item": quantity_item * price_unit_item
                     })
-                    st.success(f"Item '{selected_product_name_item}' ({quantity_item}) adicionado. Adicione mais ou finalize a remessa.")
+                    st.success(f"Item '{selected_product_name_item}' ({quantity_item}) adicionado. Restam {available - quantity_item:,.2f} disponíveis. Adicione mais ou finalize a remessa.")
                 else:
                     st.error("Produto selecionado para item não encontrado. Por favor, tente novamente.")
 
@@ -260,14 +379,28 @@ def render_shipment_management_section():
         st.markdown("##### Itens Adicionados à Remessa Atual")
         if st.session_state.current_shipment_items:
             df_current_items = pd.DataFrame(st.session_state.current_shipment_items)
-            df_current_items_display = df_current_items[['nome_produto', 'quantidade_remetida', 'preco_unitario_na_remessa', 'subtotal_item']]
-            df_current_items_display.columns = ['Produto', 'Qtd.', 'Preço Unit.', 'Subtotal']
-
-            # Formatação para exibição
-            df_current_items_display['Preço Unit.'] = df_current_items_display['Preço Unit.'].apply(lambda x: f"R$ {x:,.2f}")
-            df_current_items_display['Subtotal'] = df_current_items_display['Subtotal'].apply(lambda x: f"R$ {x:,.2f}")
-
-            st.dataframe(df_current_items_display, use_container_width=True, hide_index=True)
+            try:
+                remaining_by_product = {
+                    product_id: get_available_to_ship(product_id, st.session_state.current_shipment_items)
+                    for product_id in df_current_items['produto_id'].unique()
+                }
+                df_current_items['disponivel_restante'] = df_current_items['produto_id'].map(remaining_by_product)
+            except Exception as e:
+                st.warning(f"Não foi possível consultar o estoque disponível: {e}")
+                df_current_items['disponivel_restante'] = None
+            df_current_items_display = df_current_items[['nome_produto', 'quantidade_remetida', 'preco_unitario_na_remessa', 'subtotal_item', 'disponivel_restante']]
+            df_current_items_display.columns = ['Produto', 'Qtd.', 'Preço Unit.', 'Subtotal', 'Disponível Restante']
+
+            # Formatação aplicada na exibição; os valores continuam numéricos
+            st.dataframe(
+                df_current_items_display, use_container_width=True, hide_index=True,
+                column_config={
+                    'Qtd.': quantity_column('Qtd.'),
+                    'Preço Unit.': currency_column('Preço Unit.'),
+                    'Subtotal': currency_column('Subtotal'),
+                    'Disponível Restante': quantity_column('Disponível Restante')
+                }
+            )
 
             total_current_shipment = sum(item['subtotal_item'] for item in st.session_state.current_shipment_items)
             st.metric("Total da Remessa Atual (preliminar)", f"R$ {total_current_shipment:,.2f}")
@@ -289,7 +422,7 @@ def render_shipment_management_section():
             )
             shipment_date = st.date_input(
                 "Data da Remessa",
-                value=datetime.now().date(),
+                value=today(),
                 key="final_rem_date_input",
                 help="A data real em que a remessa foi realizada."
             )
@@ -299,12 +432,26 @@ def render_shipment_management_section():
             finalize_button = st.form_submit_button("Finalizar Remessa")
 
             if finalize_button:
+                # Revalida o estoque: outros usuários podem ter movimentado os produtos desde que os itens foram adicionados
+                shortages = []
+                stock_check_error = None
+                if st.session_state.current_shipment_items:
+                    try:
+                        shortages = find_items_exceeding_stock(st.session_state.current_shipment_items)
+                    except Exception as e:
+                        stock_check_error = e
+
                 if not st.session_state.current_shipment_items:
                     st.warning("Adicione pelo menos um item à remessa antes de finalizar.")
                     # Nao retorna para permitir que o usuario adicione itens
                 elif not destination:
                     st.warning("O 'Destino da Remessa' é obrigatório. Por favor, preencha.")
                     # Nao retorna para permitir que o usuario preencha
+                elif stock_check_error:
+                    st.error(f"Erro ao validar o estoque disponível: {stock_check_error}. Tente novamente.")
+                elif shortages:
+                    for name, quantity, balance in shortages:
+                        st.error(f"Estoque insuficiente para '{name}': remessa pede {quantity:,.2f}, saldo atual {balance:,.2f}. Ajuste os itens.")
                 else:
                     try:
                         with st.spinner("Finalizando e registrando remessa..."):
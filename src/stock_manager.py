@@ -1,11 +1,31 @@
 # src/stock_manager.py
+import os
+import logging
 import streamlit as st
 import pandas as pd
-from src.database import get_supabase_client
-from datetime import datetime, date, timedelta
-from src.product_manager import get_products_data # Importado no topo
+from src.database import get_supabase_client, fetch_all_rows
+from datetime import date, timedelta
+from src.product_manager import get_products_data, fetch_products # Importado no topo
+from src.cache import cached, invalidate, get_cache_backend
+from src.display import render_stale_notice, datetime_column, quantity_column, to_local_datetimes
+from src.date_utils import day_to_timestamp, filter_day_range, today
 import plotly.express as px # Importando Plotly para gráficos
 
+logger = logging.getLogger(__name__)
+
+# Intervalo para recarregar o cache de saldos a partir do banco (corrige eventuais divergências)
+BALANCE_CACHE_RESEED_SECONDS = int(os.getenv("BALANCE_CACHE_RESEED_SECONDS", "600"))
+_BALANCE_CACHE_LOADED_KEY = "estoque:saldo:carregado"
+_BALANCE_DRIFT_TOLERANCE = 1e-6 # Diferença entre cache e banco a partir da qual o cache de saldos é recarregado
+
+def movement_sign(movement_type: str) -> int:
+    """Retorna +1 para movimentos que somam ao saldo, -1 para os que subtraem e 0 para tipos desconhecidos."""
+    if movement_type.startswith('entrada') or movement_type == 'ajuste_positivo':
+        return 1
+    if movement_type.startswith('saida') or movement_type == 'ajuste_negativo':
+        return -1
+    return 0
+
 # --- Funções de Interação com o Banco de Dados ---
 
 def insert_stock_movement(product_id: str, movement_type: str, quantity_moved: float, observation: str = None, transaction_ref_id: str = None, movement_date: date = None):
@@ -22,82 +42,181 @@ def insert_stock_movement(product_id: str, movement_type: str, quantity_moved: f
         "referencia_transacao_id": transaction_ref_id
     }
     if movement_date:
-        data["data_movimento"] = str(movement_date) + "T00:00:00Z"
+        data["data_movimento"] = day_to_timestamp(movement_date)
 
     try:
         with st.spinner("Registrando movimento de estoque..."):
             response = supabase.from_('movimentos_estoque').insert(data).execute()
+        invalidate('movimentos')
+        _apply_movement_to_balance_cache(product_id, movement_type, quantity_moved)
         return response.data
     except Exception as e:
         st.error(f"Erro ao registrar movimento: {e}. Por favor, verifique os dados e tente novamente.")
         return None
 
-def get_all_products_for_stock_calc():
-    """Busca todos os produtos para uso interno no cálculo de estoque."""
-    return get_products_data()
+def _balance_key(product_id: str) -> str:
+    return f"estoque:saldo:{product_id}"
 
-def get_current_stock_summary(start_date: date = None, end_date: date = None):
+def _load_balance_cache(backend):
+    """Carrega no cache o saldo de todos os produtos, calculado a partir das agregações mensais."""
+    totals = fetch_movement_totals.refresh(None, None)
+    balances = {
+        _balance_key(product_id): repr(sum(movement_sign(movement_type) * quantity for movement_type, quantity in per_type.items()))
+        for product_id, per_type in totals.items()
+    }
+    if balances:
+        backend.set_many(balances)
+    backend.set(_BALANCE_CACHE_LOADED_KEY, "1", BALANCE_CACHE_RESEED_SECONDS)
+
+def _apply_movement_to_balance_cache(product_id: str, movement_type: str, quantity: float):
+    """Atualiza incrementalmente o saldo em cache após um movimento gravado com sucesso."""
+    backend = get_cache_backend()
+    try:
+        if backend.get(_BALANCE_CACHE_LOADED_KEY) is not None:
+            backend.incr_float(_balance_key(product_id), movement_sign(movement_type) * float(quantity))
+    except Exception as e:
+        # Sem atualização incremental, força a recarga completa na próxima leitura
+        logger.warning("Falha ao atualizar saldo em cache de %s: %s", product_id, e)
+        try:
+            backend.delete(_BALANCE_CACHE_LOADED_KEY)
+        except Exception:
+            pass
+
+def get_product_balance(product_id: str) -> float:
     """
-    Calcula o saldo atual de cada produto com base nos movimentos, considerando um período para cálculo de entradas/saídas.
-    O 'saldo_atual' sempre considera todos os movimentos até a `end_date`.
+    Retorna o saldo atual (todos os movimentos) de um produto em tempo constante, a partir do cache de saldos
+    mantido por `insert_stock_movement`. O cache é recarregado do banco quando ausente ou a cada
+    BALANCE_CACHE_RESEED_SECONDS. Exceções do banco são propagadas.
+    """
+    backend = get_cache_backend()
+    if backend.get(_BALANCE_CACHE_LOADED_KEY) is None:
+        _load_balance_cache(backend)
+    return float(backend.get(_balance_key(product_id)) or 0.0)
+
+def fetch_current_balances(product_ids: list) -> dict:
+    """
+    Retorna {produto_id: saldo} lido diretamente das agregações mensais (sem cache), para validações que não
+    podem depender do cache de saldos. Um movimento gravado durante uma recarga do cache pode ficar de fora dele
+    até a próxima recarga; se algum saldo em cache divergir do banco, a recarga é antecipada. Exceções do banco são propagadas.
     """
     supabase = get_supabase_client()
 
-    products_data = get_all_products_for_stock_calc()
+    def build_query():
+        return supabase.from_('movimentos_resumo_mensal').select(
+            'produto_id, tipo_movimento, quantidade_total'
+        ).in_('produto_id', list(product_ids)).order('produto_id').order('mes').order('tipo_movimento')
+
+    balances = dict.fromkeys(product_ids, 0.0)
+    for row in fetch_all_rows(build_query):
+        balances[row['produto_id']] += movement_sign(row['tipo_movimento']) * float(row['quantidade_total'])
+
+    backend = get_cache_backend()
+    try:
+        if backend.get(_BALANCE_CACHE_LOADED_KEY) is not None and any(
+            abs(float(backend.get(_balance_key(product_id)) or 0.0) - balance) > _BALANCE_DRIFT_TOLERANCE
+            for product_id, balance in balances.items()
+        ):
+            logger.warning("Cache de saldos divergente do banco; forçando recarga.")
+            backend.delete(_BALANCE_CACHE_LOADED_KEY)
+    except Exception as e:
+        logger.warning("Falha ao comparar o cache de saldos: %s", e)
+    return balances
+
+def _month_start(day: date) -> date:
+    return day.replace(day=1)
+
+def _next_month_start(day: date) -> date:
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+def _split_range_for_rollups(start_date: date = None, end_date: date = None):
+    """
+    Divide o intervalo [start_date, end_date] (inclusivo, extremos opcionais) em meses completos,
+    atendidos por `movimentos_resumo_mensal`, e pontas parciais, atendidas por `movimentos_resumo_diario`.
+    Retorna (intervalo_mensal, intervalos_diarios); o intervalo mensal é (mes_inicial, mes_final_exclusivo) ou None.
+    """
+    first_full_month = None
+    if start_date:
+        first_full_month = start_date if start_date.day == 1 else _next_month_start(start_date)
+
+    month_upper_exclusive = None
+    if end_date:
+        if _next_month_start(end_date) - timedelta(days=1) == end_date:
+            month_upper_exclusive = _next_month_start(end_date)
+        else:
+            month_upper_exclusive = _month_start(end_date)
+
+    if first_full_month and month_upper_exclusive and first_full_month >= month_upper_exclusive:
+        # Nenhum mês completo no intervalo: tudo sai da tabela diária
+        return None, [(start_date, end_date)]
+
+    daily_ranges = []
+    if start_date and first_full_month != start_date:
+        daily_ranges.append((start_date, first_full_month - timedelta(days=1)))
+    if end_date and month_upper_exclusive <= end_date:
+        daily_ranges.append((month_upper_exclusive, end_date))
+    return (first_full_month, month_upper_exclusive), daily_ranges
+
+@cached('movimentos')
+def fetch_movement_totals(start_date: date = None, end_date: date = None):
+    """
+    Soma as quantidades movimentadas por produto e tipo de movimento no intervalo informado,
+    a partir das tabelas de agregação diária/mensal. A soma é feita no banco pelas funções da
+    migration 005 (no máximo três chamadas, cada uma com uma entrada por produto × tipo).
+    Retorna {produto_id: {tipo_movimento: quantidade}}. Exceções do banco são propagadas.
+    """
+    supabase = get_supabase_client()
+    monthly_range, daily_ranges = _split_range_for_rollups(start_date, end_date)
+
+    def as_param(day):
+        return str(day) if day else None
+
+    results = []
+    if monthly_range:
+        first_month, month_upper = monthly_range
+        results.append(supabase.rpc('totais_movimentos_mensais', {
+            "p_mes_inicio": as_param(first_month), "p_mes_fim": as_param(month_upper)
+        }).execute().data)
+    for range_start, range_end in daily_ranges:
+        results.append(supabase.rpc('totais_movimentos_diarios', {
+            "p_dia_inicio": as_param(range_start), "p_dia_fim": as_param(range_end)
+        }).execute().data)
+
+    totals = {}
+    for result in results:
+        for product_id, movement_type, quantity in zip(result['produto_id'], result['tipo_movimento'], result['quantidade']):
+            product_totals = totals.setdefault(product_id, {})
+            product_totals[movement_type] = product_totals.get(movement_type, 0.0) + float(quantity)
+    return totals
+
+@cached('produtos', 'movimentos')
+def fetch_stock_summary(start_date: date = None, end_date: date = None):
+    """
+    Calcula o saldo atual de cada produto com base nos movimentos, considerando um período para cálculo de entradas/saídas.
+    O 'saldo_atual' sempre considera todos os movimentos até a `end_date`.
+    Os valores vêm das agregações diárias/mensais (ver `fetch_movement_totals`). Exceções do banco são propagadas.
+    """
+    products_data = fetch_products()
     if not products_data:
         return []
 
+    # A. Saldo TOTAL acumulado ATÉ end_date (para o "Saldo Atual Acumulado")
+    balance_totals = fetch_movement_totals(None, end_date)
+    # B. Entradas e saídas DENTRO do período filtrado (para "Total Entradas/Saídas (Período)")
+    period_totals = balance_totals if start_date is None else fetch_movement_totals(start_date, end_date)
+
     processed_data = []
     for product in products_data:
-        # A. Calcular saldo TOTAL acumulado ATÉ end_date (para o "Saldo Atual Acumulado")
-        query_total_balance = supabase.from_('movimentos_estoque').select(
-            'tipo_movimento, quantidade_movimentada'
-        ).eq('produto_id', product['id'])
-
-        if end_date:
-            end_date_plus_one = end_date + timedelta(days=1)
-            query_total_balance = query_total_balance.lt('data_movimento', str(end_date_plus_one))
-
-        try:
-            response_total_balance = query_total_balance.execute()
-        except Exception as e:
-            st.error(f"Erro ao buscar saldo acumulado para {product['nome_produto']}: {e}")
-            response_total_balance = None
-
         current_balance = 0.0
-        if response_total_balance and response_total_balance.data:
-            for mov in response_total_balance.data:
-                if mov['tipo_movimento'].startswith('entrada') or mov['tipo_movimento'] == 'ajuste_positivo':
-                    current_balance += float(mov['quantidade_movimentada'])
-                elif mov['tipo_movimento'].startswith('saida') or mov['tipo_movimento'] == 'ajuste_negativo':
-                    current_balance -= float(mov['quantidade_movimentada'])
-
-        # B. Calcular entradas e saídas DENTRO do período filtrado (para "Total Entradas/Saídas (Período)")
+        for movement_type, quantity in balance_totals.get(product['id'], {}).items():
+            current_balance += movement_sign(movement_type) * quantity
+
         total_entries_period = 0.0
         total_exits_period = 0.0
-
-        query_period_movements = supabase.from_('movimentos_estoque').select(
-            'tipo_movimento, quantidade_movimentada'
-        ).eq('produto_id', product['id'])
-
-        if start_date:
-            query_period_movements = query_period_movements.gte('data_movimento', str(start_date))
-        if end_date:
-            end_date_plus_one = end_date + timedelta(days=1)
-            query_period_movements = query_period_movements.lt('data_movimento', str(end_date_plus_one))
-
-        try:
-            response_period_movements = query_period_movements.execute()
-        except Exception as e:
-            st.error(f"Erro ao buscar movimentos do período para {product['nome_produto']}: {e}")
-            response_period_movements = None
-
-        if response_period_movements and response_period_movements.data:
-            for mov in response_period_movements.data:
-                if mov['tipo_movimento'].startswith('entrada'):
-                    total_entries_period += float(mov['quantidade_movimentada'])
-                elif mov['tipo_movimento'].startswith('saida') or mov['tipo_movimento'] == 'ajuste_negativo':
-                    total_exits_period += float(mov['quantidade_movimentada'])
+        for movement_type, quantity in period_totals.get(product['id'], {}).items():
+            if movement_type.startswith('entrada'):
+                total_entries_period += quantity
+            elif movement_type.startswith('saida') or movement_type == 'ajuste_negativo':
+                total_exits_period += quantity
 
         processed_data.append({
             'produto_id': product['id'],
@@ -109,38 +228,54 @@ def get_current_stock_summary(start_date: date = None, end_date: date = None):
         })
     return processed_data
 
+def get_current_stock_summary(start_date: date = None, end_date: date = None):
+    """Retorna o resumo de saldos (ver `fetch_stock_summary`), exibindo erros na interface."""
+    try:
+        with st.spinner("Calculando saldos de estoque..."):
+            result = fetch_stock_summary.fetch(start_date, end_date)
+        render_stale_notice(result, "Saldos de estoque")
+        return result.value
+    except Exception as e:
+        st.error(f"Erro ao calcular saldos de estoque: {e}")
+        return []
+
+
+@cached('produtos', 'movimentos')
+def fetch_detailed_movements(start_date: date = None, end_date: date = None):
+    """
+    Busca todos os movimentos de estoque com nome do produto, filtrados por data (com cache).
+    Exceções do banco são propagadas.
+    """
+    supabase = get_supabase_client()
+    query = supabase.from_('movimentos_estoque').select('*, produtos(nome_produto)').order('data_movimento', desc=True)
+    query = filter_day_range(query, 'data_movimento', start_date, end_date)
+
+    response = query.execute()
+
+    data = []
+    if response.data:
+        for item in response.data:
+            name_product = item['produtos']['nome_produto'] if item['produtos'] else 'N/A'
+            data.append({
+                "ID Movimento": item['id'],
+                "Produto": name_product,
+                "Tipo": item['tipo_movimento'],
+                "Quantidade": item['quantidade_movimentada'],
+                "Data": item['data_movimento'],
+                "Observação": item['observacao'],
+                "Ref. Transação": item['referencia_transacao_id']
+            })
+    return data
 
 def get_detailed_movements(start_date: date = None, end_date: date = None):
     """
     Busca todos os movimentos de estoque com nome do produto, filtrados por data.
     """
-    supabase = get_supabase_client()
     try:
         with st.spinner("Carregando histórico de movimentos..."):
-            query = supabase.from_('movimentos_estoque').select('*, produtos(nome_produto)').order('data_movimento', desc=True)
-
-            if start_date:
-                query = query.gte('data_movimento', str(start_date))
-            if end_date:
-                end_date_plus_one = end_date + timedelta(days=1)
-                query = query.lt('data_movimento', str(end_date_plus_one))
-
-            response = query.execute()
-
-            data = []
-            if response.data:
-                for item in response.data:
-                    name_product = item['produtos']['nome_produto'] if item['produtos'] else 'N/A'
-                    data.append({
-                        "ID Movimento": item['id'],
-                        "Produto": name_product,
-                        "Tipo": item['tipo_movimento'],
-                        "Quantidade": item['quantidade_movimentada'],
-                        "Data": item['data_movimento'],
-                        "Observação": item['observacao'],
-                        "Ref. Transação": item['referencia_transacao_id']
-                    })
-            return data
+            result = fetch_detailed_movements.fetch(start_date, end_date)
+        render_stale_notice(result, "Histórico de movimentos")
+        return result.value
     except Exception as e:
         st.error(f"Erro ao carregar movimentos detalhados: {e}")
         return []
@@ -152,8 +287,8 @@ def render_stock_summary_section():
     st.header("📊 Saldo e Resumo de Estoque")
 
     # Definir um período padrão para os filtros de data
-    default_start_date = datetime.now().date().replace(day=1)
-    default_end_date = datetime.now().date()
+    default_start_date = today().replace(day=1)
+    default_end_date = today()
 
     col1, col2 = st.columns(2)
     with col1:
@@ -285,8 +420,8 @@ def render_detailed_movements_section():
     with tab1:
         st.subheader("Histórico Detalhado de Movimentos")
 
-        default_start_date = datetime.now().date().replace(day=1)
-        default_end_date = datetime.now().date()
+        default_start_date = today().replace(day=1)
+        default_end_date = today()
 
         col1, col2 = st.columns(2)
         with col1:
@@ -307,9 +442,12 @@ def render_detailed_movements_section():
         movements = get_detailed_movements(start_date=start_date_movements, end_date=end_date_movements) # <-- Correção da variável
         if movements:
             df_movements = pd.DataFrame(movements)
-            df_movements['Data'] = pd.to_datetime(df_movements['Data']).dt.strftime('%d/%m/%Y %H:%M:%S')
+            df_movements['Data'] = to_local_datetimes(df_movements['Data'])
             display_cols = ['Produto', 'Tipo', 'Quantidade', 'Data', 'Observação']
-            st.dataframe(df_movements[display_cols], use_container_width=True, hide_index=True)
+            st.dataframe(
+                df_movements[display_cols], use_container_width=True, hide_index=True,
+                column_config={'Quantidade': quantity_column('Quantidade'), 'Data': datetime_column('Data')}
+            )
             st.info(f"Total de movimentos no período: **{len(df_movements)}**")
         else:
             st.info("Nenhum movimento de estoque registrado no período selecionado.")
@@ -354,7 +492,7 @@ def render_detailed_movements_section():
 
             movement_date = st.date_input(
                 "Data do Movimento",
-                value=datetime.now().date(),
+                value=today(),
                 key="mov_date_input",
                 help="A data real em que o movimento de estoque ocorreu."
             )